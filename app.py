@@ -5,13 +5,239 @@ v2.0 — Rediseño completo con nombres de jugadores, UI premium y tarjetas flip
 Las tarjetas se renderizan con st.components.v1.html() para soporte completo de CSS/JS.
 """
 
+import hashlib
+import json
+import math
+import mmap
+import os
 import random
+import re
+import struct
+import threading
 import time
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import List, Optional
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import List, Optional, Tuple
 
 import streamlit as st
-import streamlit.components.v1 as components
+
+# Las dependencias pesadas (SQLAlchemy, sqlite3, componentes iframe) se importan
+# en su primer uso: una partida con el dataset por defecto nunca las necesita.
+# `python tools/startup_budget.py` comprueba el presupuesto de arranque.
+
+# ╔══════════════════════════════════════════════════════════════╗
+#  SECCIÓN 0 — NORMALIZACIÓN Y SIMILITUD (TRIGRAMAS)
+# ╚══════════════════════════════════════════════════════════════╝
+# Mismo esquema que pg_trgm: cada palabra se rellena como "  palabra " y se
+# trocea en trigramas; la similitud es |A∩B| / |A∪B|.
+
+WORD_SIMILARITY_LIMIT = 0.6  # palabras del banco: "Playa" ~ "Playas"
+HINT_SIMILARITY_LIMIT = 0.5  # pista vs. palabra secreta: "Llave" ~ "Llavero"
+
+_ARTICLES = {"el", "la", "los", "las", "lo", "un", "una", "unos", "unas"}
+
+
+def normalize_term(text: str) -> str:
+    """'  Las Playas ' → 'playa': sin tildes, mayúsculas, artículos, signos ni plural."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    words = re.findall(r"[a-z0-9ñ]+", text)
+    words = [w for w in words if w not in _ARTICLES] or words
+    # Plural ingenuo ("playas" → "playa"): basta con que sea consistente
+    return " ".join(w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words)
+
+
+def term_trigrams(normalized: str) -> frozenset:
+    grams = set()
+    for w in normalized.split():
+        padded = f"  {w} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    ta, tb = term_trigrams(normalize_term(a)), term_trigrams(normalize_term(b))
+    if not ta or not tb:
+        return 0.0
+    shared = len(ta & tb)
+    return shared / (len(ta) + len(tb) - shared)
+
+
+def hint_reveals_word(word: str, hint: str) -> bool:
+    # La pista contiene la palabra entera ("Sopa de ajo" para "Sopa") o es casi igual
+    word_tokens = {t for t in normalize_term(word).split() if len(t) > 2}
+    if word_tokens and word_tokens <= set(normalize_term(hint).split()):
+        return True
+    return trigram_similarity(word, hint) >= HINT_SIMILARITY_LIMIT
+
+
+class TrigramIndex:
+    """
+    Índice invertido trigrama → términos para buscar casi-duplicados.
+    Usa filtrado por prefijo: un término con similitud ≥ t comparte al menos
+    ceil(t·|q|) trigramas con la consulta, así que basta con recorrer las
+    listas de los |q|-m+1 trigramas más raros y verificar esos candidatos.
+    """
+
+    def __init__(self, terms=()) -> None:
+        self._terms: List[str] = []
+        self._grams: List[frozenset] = []
+        self._exact: dict = {}      # normalizado -> [ids]
+        self._postings: dict = {}   # trigrama -> [ids]
+        self._dead: set = set()     # ids borrados (lápidas hasta compactar)
+        for term in terms:
+            self.add(term)
+
+    def __len__(self) -> int:
+        return len(self._terms) - len(self._dead)
+
+    def add(self, term: str) -> None:
+        normalized = normalize_term(term)
+        grams = term_trigrams(normalized)
+        tid = len(self._terms)
+        self._terms.append(term)
+        self._grams.append(grams)
+        self._exact.setdefault(normalized, []).append(tid)
+        for g in grams:
+            self._postings.setdefault(g, []).append(tid)
+
+    def remove(self, term: str) -> None:
+        """Marca el término como borrado; las listas se compactan cuando las lápidas superan a los vivos."""
+        normalized = normalize_term(term)
+        ids = self._exact.get(normalized, [])
+        for tid in [t for t in ids if self._terms[t] == term]:
+            ids.remove(tid)
+            self._dead.add(tid)
+        if not ids:
+            self._exact.pop(normalized, None)
+        if len(self._dead) > len(self):
+            live = [t for i, t in enumerate(self._terms) if i not in self._dead]
+            self.__init__(live)
+
+    def similar(self, term: str, threshold: float = WORD_SIMILARITY_LIMIT) -> List[str]:
+        normalized = normalize_term(term)
+        if not normalized:
+            # Emoji u otra escritura: sin forma normalizada no hay con qué comparar
+            return []
+        if normalized in self._exact:
+            return [self._terms[self._exact[normalized][0]]]
+        query = term_trigrams(normalized)
+        if not query:
+            return []
+
+        required = math.ceil(threshold * len(query))
+        by_rarity = sorted(query, key=lambda g: len(self._postings.get(g, ())))
+        candidates = set()
+        for g in by_rarity[:len(query) - required + 1]:
+            candidates.update(self._postings.get(g, ()))
+        candidates -= self._dead
+
+        matches = []
+        for tid in candidates:
+            grams = self._grams[tid]
+            shared = len(query & grams)
+            if shared / (len(query) + len(grams) - shared) >= threshold:
+                matches.append(self._terms[tid])
+        return matches
+
+# ╔══════════════════════════════════════════════════════════════╗
+#  MÓDULO DE DIFICULTAD (MUESTREO PONDERADO CON TABLAS DE ALIAS)
+# ╚══════════════════════════════════════════════════════════════╝
+# Palabras y pistas pueden llevar un nivel con el sufijo "~N": 1 = obvia /
+# palabra común, 3 = sutil / palabra rara ("Faro~1", "Destello~3"). Sin
+# sufijo valen DEFAULT_LEVEL. Al guardar, el nivel de la palabra va como un
+# "~N" suelto delante de las pistas, así no cambia el esquema de la BD.
+#
+# La dificultad elegida en el setup convierte niveles en pesos, y cada
+# WordEntry / RoomBank precalcula al crearse una tabla de alias (Walker) por
+# dificultad: repartir es O(1) por pista y no recalcula nada.
+
+DEFAULT_LEVEL = 2
+DIFFICULTY_WEIGHTS = {
+    "fácil":   {1: 4.0, 2: 2.0, 3: 1.0},
+    "normal":  {1: 1.0, 2: 1.0, 3: 1.0},
+    "difícil": {1: 1.0, 2: 2.0, 3: 4.0},
+}
+
+_LEVEL_SUFFIX = re.compile(r"\s*~\s*([1-3])\s*$")
+
+
+def split_level(text: str) -> Tuple[str, int]:
+    """'Destello~3' → ('Destello', 3); sin sufijo → (texto, DEFAULT_LEVEL)."""
+    m = _LEVEL_SUFFIX.search(text)
+    if m is None:
+        return text, DEFAULT_LEVEL
+    return text[:m.start()].strip(), int(m.group(1))
+
+
+def parse_levels(word: str, hints: List[str]) -> Tuple[str, int, List[str], Tuple[int, ...]]:
+    word, level = split_level(word)
+    parsed = [split_level(h) for h in hints]
+    if parsed and not parsed[0][0]:
+        # "~N" suelto al principio: nivel de la palabra (formato guardado)
+        level = parsed.pop(0)[1]
+    return word, level, [h for h, _ in parsed], tuple(lv for _, lv in parsed)
+
+
+def with_level(text: str, level: int) -> str:
+    return text if level == DEFAULT_LEVEL else f"{text}~{level}"
+
+
+class AliasTable:
+    """Muestreo ponderado O(1) por el método de alias de Walker (variante de Vose)."""
+
+    __slots__ = ("prob", "alias", "total")
+
+    def __init__(self, weights: List[float]) -> None:
+        n = len(weights)
+        self.total = float(sum(weights))
+        self.prob  = [1.0] * n
+        self.alias = list(range(n))
+        if not n or self.total <= 0:
+            return
+        scaled = [w * n / self.total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s], self.alias[s] = scaled[s], l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    def sample(self) -> int:
+        i = random.randrange(len(self.prob))
+        return i if random.random() < self.prob[i] else self.alias[i]
+
+    def sample_distinct(self, k: int) -> List[int]:
+        """k índices distintos (sin reemplazo) descartando repetidos."""
+        k = min(k, len(self.prob))
+        picked, seen = [], set()
+        for _ in range(32 * k):
+            if len(picked) == k:
+                break
+            i = self.sample()
+            if i not in seen:
+                seen.add(i)
+                picked.append(i)
+        if len(picked) < k:
+            # Pesos muy sesgados: el resto, uniforme entre los que faltan
+            rest = [i for i in range(len(self.prob)) if i not in seen]
+            picked += random.sample(rest, k - len(picked))
+        return picked
+
+
+def difficulty_tables(levels) -> dict:
+    levels = list(levels)
+    return {d: AliasTable([w[lv] for lv in levels]) for d, w in DIFFICULTY_WEIGHTS.items()}
 
 # ╔══════════════════════════════════════════════════════════════╗
 #  SECCIÓN 1 — MODELOS DE DATOS
@@ -21,10 +247,27 @@ import streamlit.components.v1 as components
 class WordEntry:
     word: str
     hints: List[str]
+    level: int = field(default=DEFAULT_LEVEL, init=False)
+    hint_levels: Tuple[int, ...] = field(default=(), init=False)
+    hint_tables: dict = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
+        word, level, hints, hint_levels = parse_levels(self.word, self.hints)
+        object.__setattr__(self, "word", word)
+        object.__setattr__(self, "hints", hints)
+        object.__setattr__(self, "level", level)
+        object.__setattr__(self, "hint_levels", hint_levels)
+        object.__setattr__(self, "hint_tables", difficulty_tables(hint_levels))
         if len(self.hints) < 3:
             raise ValueError(f"'{self.word}' requiere mínimo 3 pistas.")
+        for hint in self.hints:
+            if hint_reveals_word(self.word, hint):
+                raise ValueError(f"La pista '{hint}' es demasiado parecida a '{self.word}'.")
+
+    def stored_hints(self) -> List[str]:
+        # Pistas tal y como se guardan (BD y snapshots), con sus niveles
+        prefix = [with_level("", self.level)] if self.level != DEFAULT_LEVEL else []
+        return prefix + [with_level(h, lv) for h, lv in zip(self.hints, self.hint_levels)]
 
 
 @dataclass
@@ -43,6 +286,8 @@ class GameConfig:
     hints_enabled: bool = True
     custom_mode: bool = False
     chaos_mode: bool = False
+    categories: List[str] = field(default_factory=list)  # vacío = todas
+    difficulty: str = "normal"  # clave de DIFFICULTY_WEIGHTS
 
     @property
     def total_players(self) -> int:
@@ -57,6 +302,8 @@ class GameState:
     round_start_time: Optional[float] = None
     starting_player_name: Optional[str] = None
     reveal_done: bool = False
+    # (origen, índice, versión del banco, categoría) de la palabra elegida
+    word_ref: Optional[Tuple[int, int, str, str]] = None
 
 
 # ╔══════════════════════════════════════════════════════════════╗
@@ -73,19 +320,26 @@ STATE_VOTING       = "VOTING"
 #  SECCIÓN 3 — DATASET
 # ╚══════════════════════════════════════════════════════════════╝
 
-DEFAULT_DATASET: List[WordEntry] = [
-    WordEntry("Aeropuerto",  ["Pista", "Sala de embarque", "Control", "Tiendas", "Torre"]),
-    WordEntry("Restaurante", ["Camarero", "Carta", "Propina", "Chef", "Reserva"]),
-    WordEntry("Estadio",     ["Grada", "Marcador", "Árbitro", "Butacas", "Himno"]),
-    WordEntry("Hospital",    ["Urgencias", "Quirófano", "Camilla", "Bata", "Monitor"]),
-    WordEntry("Biblioteca",  ["Silencio", "Carnet", "Estanterías", "Préstamo", "Estudiar"]),
-    WordEntry("Playa",       ["Sombrilla", "Arena", "Socorrista", "Chiringuito", "Olas"]),
-    WordEntry("Montaña",     ["Nevada", "Senderismo", "Refugio", "Altitud", "Osos"]),
-    WordEntry("Cine",        ["Palomitas", "Pantalla", "Oscuro", "Taquilla", "Butacas"]),
-    WordEntry("Mercado",     ["Fruta", "Centro", "Olores", "Carrito", "Pescadería"]),
-    WordEntry("Barco",       ["Cubierta", "Ancla", "Capitán", "Mar", "Salvavidas"]),
+# Respaldo mínimo si el corpus integrado (corpus/*.txt) no está disponible.
+# Se valida en su primer uso: casi nunca hace falta y no debe pagarse al importar.
+DEFAULT_WORDS = [
+    ("Aeropuerto",  ["Pista", "Sala de embarque", "Control", "Tiendas", "Torre"]),
+    ("Restaurante", ["Camarero", "Carta", "Propina", "Chef", "Reserva"]),
+    ("Estadio",     ["Grada", "Marcador", "Árbitro", "Butacas", "Himno"]),
+    ("Hospital",    ["Urgencias", "Quirófano", "Camilla", "Bata", "Monitor"]),
+    ("Biblioteca",  ["Silencio", "Carnet", "Estanterías", "Préstamo", "Estudiar"]),
+    ("Playa",       ["Sombrilla", "Arena", "Socorrista", "Chiringuito", "Olas"]),
+    ("Montaña",     ["Nevada", "Senderismo", "Refugio", "Altitud", "Osos"]),
+    ("Cine",        ["Palomitas", "Pantalla", "Oscuro", "Taquilla", "Butacas"]),
+    ("Mercado",     ["Fruta", "Centro", "Olores", "Carrito", "Pescadería"]),
+    ("Barco",       ["Cubierta", "Ancla", "Capitán", "Mar", "Salvavidas"]),
 ]
 
+
+@lru_cache(maxsize=1)
+def default_dataset() -> List[WordEntry]:
+    return [WordEntry(word, hints) for word, hints in DEFAULT_WORDS]
+
 # ╔══════════════════════════════════════════════════════════════╗
 #  SECCIÓN 4 — ESTILOS GLOBALES STREAMLIT
 # ╚══════════════════════════════════════════════════════════════╝
@@ -217,138 +471,1260 @@ html, body, [data-testid="stApp"] {
 </style>
 """
 # ╔══════════════════════════════════════════════════════════════╗
-#  MÓDULO DE BASE DE DATOS (NEON / POSTGRESQL)
+#  MÓDULO DE BASE DE DATOS (REPOSITORIO: NEON / SQLITE / MEMORIA)
 # ╚══════════════════════════════════════════════════════════════╝
-from sqlalchemy import text
+# Backend seleccionado por configuración: variable de entorno o sección
+# [storage] de secrets.toml. "postgres" (Neon) es el valor histórico.
+STORAGE_POSTGRES = "postgres"
+STORAGE_SQLITE   = "sqlite"
+STORAGE_MEMORY   = "memory"
 
-def get_db_connection():
-    return st.connection("neon", type="sql")
 
-def get_room_id():
-    # Retorna la clave de sala actual o 'public' por defecto
-    return st.session_state.get("room_id", "public").strip() or "public"
+def _sql(query: str):
+    from sqlalchemy import text
+    return text(query)
+
 
-def init_db():
-    conn = get_db_connection()
+def _storage_setting(name: str, default: str) -> str:
+    env_value = os.environ.get(f"IMPOSTOR_{name.upper()}")
+    if env_value:
+        return env_value
     try:
-        with conn.session as s:
-            s.execute(text("""
+        return str(st.secrets["storage"][name])
+    except Exception:
+        return default
+
+
+def _word_entries(rows) -> Tuple[List[WordEntry], List[Tuple[str, List[str], str]]]:
+    """
+    Separa las filas guardadas en (válidas, rechazadas). Las rechazadas son
+    filas antiguas que ya no pasan la validación: siguen en la BD, así que se
+    devuelven como (palabra, pistas, motivo) para mostrarlas y poder borrarlas.
+    """
+    entries, rejected = [], []
+    for word, hints in rows:
+        try:
+            entries.append(WordEntry(word=word, hints=hints))
+        except ValueError as e:
+            rejected.append((word, list(hints), str(e)))
+    return entries, rejected
+
+
+class StorageBackend(ABC):
+    """Repositorio de palabras y grupos de jugadores, particionado por sala."""
+
+    def __init__(self) -> None:
+        self._schema_lock  = threading.Lock()
+        self._schema_ready = False
+        self._similarity: dict = {}  # room_id -> TrigramIndex en memoria
+        self._similarity_lock = threading.Lock()
+
+    def ensure_schema(self) -> None:
+        # El DDL se ejecuta una sola vez por proceso, en el primer acceso real
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if not self._schema_ready:
+                self.init_schema()
+                self._schema_ready = True
+
+    @abstractmethod
+    def init_schema(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_word_rows(self, room_id: str) -> List[Tuple[str, List[str]]]:
+        """Filas (palabra, pistas) tal cual están guardadas, sin validar."""
+        raise NotImplementedError
+
+    def load_words(self, room_id: str) -> List[WordEntry]:
+        return _word_entries(self.load_word_rows(room_id))[0]
+
+    @abstractmethod
+    def add_word(self, room_id: str, word: str, hints: List[str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_word(self, room_id: str, word: str) -> None:
+        raise NotImplementedError
+
+    def similar_words(self, room_id: str, word: str, threshold: float = WORD_SIMILARITY_LIMIT) -> List[str]:
+        # Índice de trigramas en memoria por sala; se construye en la primera
+        # consulta y las escrituras lo actualizan en el sitio (ver _index_word).
+        with self._similarity_lock:
+            index = self._similarity.get(room_id)
+        if index is None:
+            # Incluye las filas rechazadas: siguen ocupando su palabra en la BD
+            index = TrigramIndex(word for word, _ in self.load_word_rows(room_id))
+            with self._similarity_lock:
+                index = self._similarity.setdefault(room_id, index)
+        with self._similarity_lock:
+            return index.similar(word, threshold)
+
+    def _index_word(self, room_id: str, word: str, added: bool) -> None:
+        # Sin índice cargado no hay nada que mantener: se construirá al consultar
+        with self._similarity_lock:
+            index = self._similarity.get(room_id)
+            if index is None:
+                return
+            if added:
+                index.add(word)
+            else:
+                index.remove(word)
+
+    @abstractmethod
+    def save_group(self, room_id: str, group_name: str, players: List[str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_groups(self, room_id: str) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_group(self, room_id: str, group_name: str) -> None:
+        raise NotImplementedError
+
+
+ROOM_PARTITIONS = 16  # particiones hash por tabla; cambiarlo exige re-particionar
+
+# Expresión SQL equivalente a room_key(): para migrar filas existentes en el servidor
+_ROOM_KEY_SQL = "('x' || substr(encode(sha256(convert_to({col}, 'UTF8')), 'hex'), 1, 16))::bit(64)::bigint"
+
+
+def room_key(room_id: str) -> int:
+    """Clave de partición: primeros 8 bytes de SHA-256(room_id) como BIGINT con signo."""
+    return int.from_bytes(hashlib.sha256(room_id.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+class PostgresBackend(StorageBackend):
+    """
+    Backend remoto sobre la conexión `neon` de Streamlit.
+    `custom_words` y `player_groups` están particionadas por HASH(room_key):
+    cada consulta filtra por la clave literal y el planner poda a una sola
+    partición, así el coste por sala no crece con el número de salas.
+    """
+
+    # tabla -> (columnas propias, columna única por sala, índice único)
+    TABLES = {
+        "custom_words":  (("word", "hints"), "word", "idx_words_room"),
+        "player_groups": (("group_name", "player_names"), "group_name", "idx_groups_room"),
+    }
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.conn = st.connection("neon", type="sql")
+        self.trigram_enabled = False
+
+    def init_schema(self) -> None:
+        with self.conn.session as s:
+            for table in self.TABLES:
+                kind = s.execute(_sql("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar()
+                if kind == "r":
+                    # Tabla plana de versiones anteriores: se migra a particiones
+                    self._migrate_flat_table(s, table)
+                else:
+                    self._create_partitioned_table(s, table)
+            self._backfill_word_norm(s)
+            s.commit()
+
+        # Índice de similitud (pg_trgm) sobre la forma normalizada, la misma
+        # que usa TrigramIndex. Si el rol no puede crear la extensión se
+        # recurre al índice de trigramas en memoria de la clase base.
+        try:
+            with self.conn.session as s:
+                s.execute(_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+                s.execute(_sql("DROP INDEX IF EXISTS idx_words_trgm;"))
+                s.execute(_sql("CREATE INDEX IF NOT EXISTS idx_words_norm_trgm ON custom_words USING gin (word_norm gin_trgm_ops);"))
+                s.commit()
+            self.trigram_enabled = True
+        except Exception:
+            self.trigram_enabled = False
+
+    @classmethod
+    def _create_partitioned_table(cls, s, table: str) -> None:
+        payload, unique_col, unique_idx = cls.TABLES[table]
+        s.execute(_sql(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id BIGSERIAL,
+                room_key BIGINT NOT NULL,
+                {", ".join(f"{c} TEXT NOT NULL" for c in payload)},
+                room_id TEXT NOT NULL DEFAULT 'public',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (room_key, id)
+            ) PARTITION BY HASH (room_key);
+        """))
+        for i in range(ROOM_PARTITIONS):
+            s.execute(_sql(
+                f"CREATE TABLE IF NOT EXISTS {table}_p{i} PARTITION OF {table} "
+                f"FOR VALUES WITH (MODULUS {ROOM_PARTITIONS}, REMAINDER {i});"
+            ))
+        # La unicidad por sala incluye la clave de partición (requisito de Postgres)
+        s.execute(_sql(f"CREATE UNIQUE INDEX IF NOT EXISTS {unique_idx} ON {table} (room_key, room_id, {unique_col});"))
+
+    @staticmethod
+    def _backfill_word_norm(s) -> None:
+        # normalize_term vive en Python (tildes, artículos, plural): se rellena
+        # desde aquí para las filas anteriores a la columna. Migración única:
+        # add_word siempre escribe word_norm, así que sólo puede haber NULLs
+        # justo después de añadir la columna (tabla nueva o recién migrada), y
+        # el SELECT ... IS NULL recorrería las 16 particiones en cada arranque.
+        # ALTER TABLE bloquea la tabla aunque la columna ya exista: sólo si falta
+        has_column = s.execute(_sql("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'custom_words' AND column_name = 'word_norm'
+        """)).scalar()
+        if has_column:
+            return
+        s.execute(_sql("ALTER TABLE custom_words ADD COLUMN word_norm TEXT;"))
+        rows = s.execute(_sql("SELECT room_key, id, word FROM custom_words WHERE word_norm IS NULL")).fetchall()
+        if rows:
+            s.execute(
+                _sql("UPDATE custom_words SET word_norm = :n WHERE room_key = :rk AND id = :id"),
+                [{"n": normalize_term(w), "rk": rk, "id": i} for rk, i, w in rows]
+            )
+
+    @classmethod
+    def _migrate_flat_table(cls, s, table: str) -> None:
+        payload, _, unique_idx = cls.TABLES[table]
+        legacy = f"{table}_legacy"
+        # Tablas muy antiguas pueden no tener room_id
+        s.execute(_sql(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS room_id TEXT DEFAULT 'public';"))
+        s.execute(_sql(f"ALTER TABLE {table} RENAME TO {legacy};"))
+        # Los índices conservan el nombre al renombrar la tabla: se apartan
+        s.execute(_sql(f"ALTER INDEX IF EXISTS {unique_idx} RENAME TO {unique_idx}_legacy;"))
+        s.execute(_sql("ALTER INDEX IF EXISTS idx_words_trgm RENAME TO idx_words_trgm_legacy;"))
+
+        cls._create_partitioned_table(s, table)
+        cols = ", ".join(payload)
+        rid = "COALESCE(NULLIF(btrim(room_id), ''), 'public')"
+        s.execute(_sql(f"""
+            INSERT INTO {table} (room_key, {cols}, room_id, created_at)
+            SELECT {_ROOM_KEY_SQL.format(col=rid)}, {cols}, {rid}, created_at
+            FROM {legacy}
+            ON CONFLICT DO NOTHING;
+        """))
+        s.execute(_sql(f"DROP TABLE {legacy};"))
+
+    def load_word_rows(self, room_id: str) -> List[Tuple[str, List[str]]]:
+        df = self.conn.query(
+            "SELECT word, hints FROM custom_words WHERE room_key = :rk AND room_id = :rid ORDER BY created_at DESC",
+            params={"rk": room_key(room_id), "rid": room_id}, ttl=0,
+        )
+        return [(row['word'], row['hints'].split('|')) for _, row in df.iterrows()]
+
+    def add_word(self, room_id: str, word: str, hints: List[str]) -> None:
+        with self.conn.session as s:
+            s.execute(
+                _sql("INSERT INTO custom_words (room_key, word, word_norm, hints, room_id) VALUES (:rk, :w, :n, :h, :rid)"),
+                {"rk": room_key(room_id), "w": word, "n": normalize_term(word), "h": "|".join(hints), "rid": room_id}
+            )
+            s.commit()
+        self._index_word(room_id, word, added=True)
+
+    def delete_word(self, room_id: str, word: str) -> None:
+        with self.conn.session as s:
+            s.execute(
+                _sql("DELETE FROM custom_words WHERE room_key = :rk AND room_id = :rid AND word = :w"),
+                {"rk": room_key(room_id), "rid": room_id, "w": word}
+            )
+            s.commit()
+        self._index_word(room_id, word, added=False)
+
+    def similar_words(self, room_id: str, word: str, threshold: float = WORD_SIMILARITY_LIMIT) -> List[str]:
+        if not self.trigram_enabled:
+            return super().similar_words(room_id, word, threshold)
+        normalized = normalize_term(word)
+        if not normalized:
+            return []  # igual que TrigramIndex: '' coincidiría con todas las palabras sin forma normalizada
+        with self.conn.session as s:
+            # El umbral del operador % es local a la transacción
+            s.execute(_sql("SELECT set_config('pg_trgm.similarity_threshold', :t, true)"), {"t": str(threshold)})
+            # Igual que TrigramIndex: coincidencia normalizada exacta primero
+            rows = s.execute(
+                _sql("""
+                    SELECT word FROM custom_words
+                    WHERE room_key = :rk AND room_id = :rid AND (word_norm = :n OR word_norm % :n)
+                    ORDER BY word_norm = :n DESC, similarity(word_norm, :n) DESC
+                """),
+                {"rk": room_key(room_id), "rid": room_id, "n": normalized}
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def save_group(self, room_id: str, group_name: str, players: List[str]) -> None:
+        with self.conn.session as s:
+            s.execute(
+                _sql("""
+                    INSERT INTO player_groups (room_key, group_name, player_names, room_id)
+                    VALUES (:rk, :n, :p, :rid)
+                    ON CONFLICT (room_key, room_id, group_name)
+                    DO UPDATE SET player_names = EXCLUDED.player_names;
+                """),
+                {"rk": room_key(room_id), "n": group_name, "p": "|".join(players), "rid": room_id}
+            )
+            s.commit()
+
+    def load_groups(self, room_id: str) -> dict:
+        df = self.conn.query(
+            "SELECT group_name, player_names FROM player_groups WHERE room_key = :rk AND room_id = :rid ORDER BY created_at DESC",
+            params={"rk": room_key(room_id), "rid": room_id}, ttl=0,
+        )
+        return {row['group_name']: row['player_names'].split('|') for _, row in df.iterrows()}
+
+    def delete_group(self, room_id: str, group_name: str) -> None:
+        with self.conn.session as s:
+            s.execute(
+                _sql("DELETE FROM player_groups WHERE room_key = :rk AND room_id = :rid AND group_name = :n"),
+                {"rk": room_key(room_id), "rid": room_id, "n": group_name}
+            )
+            s.commit()
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Backend embebido para despliegues locales (kiosco, tests).
+    Con path=":memory:" la base vive sólo en el proceso; en disco usa WAL
+    para que las lecturas no bloqueen a las escrituras.
+    """
+
+    def __init__(self, path: str) -> None:
+        import sqlite3
+
+        super().__init__()
+        self.path = path
+        # Una única conexión compartida entre los hilos de sesión de Streamlit
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("PRAGMA synchronous=NORMAL;")
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def init_schema(self) -> None:
+        with self.lock:
+            self.conn.executescript("""
                 CREATE TABLE IF NOT EXISTS custom_words (
-                    id SERIAL PRIMARY KEY,
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
                     word TEXT NOT NULL,
                     hints TEXT NOT NULL,
                     room_id TEXT DEFAULT 'public',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
-            """))
-            s.execute(text("""
                 CREATE TABLE IF NOT EXISTS player_groups (
-                    id SERIAL PRIMARY KEY,
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
                     group_name TEXT NOT NULL,
                     player_names TEXT NOT NULL,
                     room_id TEXT DEFAULT 'public',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
-            """))
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_words_room ON custom_words (word, room_id);
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_groups_room ON player_groups (group_name, room_id);
+                -- Los únicos empiezan por word / group_name y no sirven para WHERE room_id
+                CREATE INDEX IF NOT EXISTS idx_words_room_id ON custom_words (room_id, created_at);
+                CREATE INDEX IF NOT EXISTS idx_groups_room_id ON player_groups (room_id, created_at);
+            """)
+
+    def load_word_rows(self, room_id: str) -> List[Tuple[str, List[str]]]:
+        rows = self._execute("SELECT word, hints FROM custom_words WHERE room_id = ? ORDER BY created_at DESC, id DESC", (room_id,))
+        return [(w, h.split('|')) for w, h in rows]
+
+    def add_word(self, room_id: str, word: str, hints: List[str]) -> None:
+        self._execute("INSERT INTO custom_words (word, hints, room_id) VALUES (?, ?, ?)", (word, "|".join(hints), room_id))
+        self._index_word(room_id, word, added=True)
+
+    def delete_word(self, room_id: str, word: str) -> None:
+        self._execute("DELETE FROM custom_words WHERE word = ? AND room_id = ?", (word, room_id))
+        self._index_word(room_id, word, added=False)
+
+    def save_group(self, room_id: str, group_name: str, players: List[str]) -> None:
+        self._execute(
+            """
+            INSERT INTO player_groups (group_name, player_names, room_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT (group_name, room_id)
+            DO UPDATE SET player_names = excluded.player_names;
+            """,
+            (group_name, "|".join(players), room_id),
+        )
 
-            # Migración Automática: Añadir columna room_id si la tabla es antigua
-            s.execute(text("ALTER TABLE custom_words ADD COLUMN IF NOT EXISTS room_id TEXT DEFAULT 'public';"))
-            s.execute(text("ALTER TABLE player_groups ADD COLUMN IF NOT EXISTS room_id TEXT DEFAULT 'public';"))
+    def load_groups(self, room_id: str) -> dict:
+        rows = self._execute("SELECT group_name, player_names FROM player_groups WHERE room_id = ? ORDER BY created_at DESC, id DESC", (room_id,))
+        return {name: players.split('|') for name, players in rows}
 
-            # Corregir Unicidad: Eliminar restricción global vieja y crear la nueva por sala
-            # Borra constraint antigua (si existe) que impedía repetir palabras entre salas
-            s.execute(text("ALTER TABLE custom_words DROP CONSTRAINT IF EXISTS custom_words_word_key;"))
-            s.execute(text("ALTER TABLE player_groups DROP CONSTRAINT IF EXISTS player_groups_group_name_key;"))
-            
-            # Crea índices únicos combinados (Palabra + Sala)
-            s.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_words_room ON custom_words (word, room_id);"))
-            s.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_groups_room ON player_groups (group_name, room_id);"))
+    def delete_group(self, room_id: str, group_name: str) -> None:
+        self._execute("DELETE FROM player_groups WHERE group_name = ? AND room_id = ?", (group_name, room_id))
 
-            s.commit()
-    except Exception as e:
-        st.error(f"Error DB: {e}")
 
-def load_words_from_db() -> List[WordEntry]:
-    conn = get_db_connection()
-    rid = get_room_id()
+def lazy_cache_resource(factory):
+    """
+    @st.cache_resource aplicado en la primera llamada de cada ejecución y no al
+    importar: el primer decorador del proceso paga inspect.getsource en frío
+    (tokenize + inspect.getmodule sobre todos los módulos cargados, ~6 ms), y
+    así ese coste queda fuera de `import app` y nunca lo pagan las
+    herramientas que sólo importan app. La clave de caché es la misma.
+    El recurso se recuerda durante la ejecución: cada búsqueda en la caché
+    cuesta ~30 µs y las cachés del proceso se consultan varias veces por mesa.
+    """
+    cached = value = None
+
+    def get():
+        nonlocal cached, value
+        if value is None:
+            if cached is None:
+                # Sin spinner: get_storage() se resuelve en el hilo de refresco
+                cached = st.cache_resource(factory, show_spinner=False)
+            value = cached()
+        return value
+
+    return get
+
+
+@lazy_cache_resource
+def get_storage() -> StorageBackend:
+    # Una instancia por proceso: compartida entre todas las sesiones
+    kind = _storage_setting("storage", STORAGE_POSTGRES).lower()
+    if kind == STORAGE_SQLITE:
+        return SQLiteBackend(_storage_setting("sqlite_path", "impostor.db"))
+    if kind == STORAGE_MEMORY:
+        return SQLiteBackend(":memory:")
+    return PostgresBackend()
+
+def get_room_id():
+    # Retorna la clave de sala actual o 'public' por defecto
+    return st.session_state.get("room_id", "public").strip() or "public"
+
+def _ready_storage() -> StorageBackend:
+    storage = get_storage()
+    storage.ensure_schema()
+    return storage
+
+def _after_write(rid: str) -> None:
+    # Tras una escritura se refresca la caché de la sala de forma síncrona:
+    # el usuario espera ver su cambio en el siguiente rerun.
     try:
-        df = conn.query("SELECT word, hints FROM custom_words WHERE room_id = :rid ORDER BY created_at DESC", params={"rid": rid}, ttl=0)
-        dataset = []
-        if not df.empty:
-            for _, row in df.iterrows():
-                dataset.append(WordEntry(word=row['word'], hints=row['hints'].split('|')))
-        return dataset
+        refresh_room_bank(rid)
     except Exception:
-        return []
+        pass
 
 def add_word_to_db(word: str, hints: List[str]) -> bool:
-    conn = get_db_connection()
     rid = get_room_id()
-    hints_str = "|".join(hints)
     try:
-        with conn.session as s:
-            s.execute(
-                text("INSERT INTO custom_words (word, hints, room_id) VALUES (:w, :h, :rid)"),
-                {"w": word, "h": hints_str, "rid": rid}
-            )
-            s.commit()
-        return True
+        _ready_storage().add_word(rid, word, hints)
     except Exception:
         return False
+    _after_write(rid)
+    return True
 
 def delete_word_from_db(word: str):
-    conn = get_db_connection()
     rid = get_room_id()
     try:
-        with conn.session as s:
-            s.execute(text("DELETE FROM custom_words WHERE word = :w AND room_id = :rid"), {"w": word, "rid": rid})
-            s.commit()
+        _ready_storage().delete_word(rid, word)
     except Exception:
-        pass
+        return
+    _after_write(rid)
 
 def save_player_group_db(group_name: str, players: List[str]) -> bool:
-    conn = get_db_connection()
     rid = get_room_id()
-    players_str = "|".join(players)
     try:
-        with conn.session as s:
-            s.execute(
-                text("""
-                    INSERT INTO player_groups (group_name, player_names, room_id) 
-                    VALUES (:n, :p, :rid)
-                    ON CONFLICT (group_name, room_id) 
-                    DO UPDATE SET player_names = EXCLUDED.player_names;
-                """),
-                {"n": group_name, "p": players_str, "rid": rid}
-            )
-            s.commit()
-        return True
+        _ready_storage().save_group(rid, group_name, players)
     except Exception:
         return False
+    _after_write(rid)
+    return True
+
+def find_similar_words(word: str) -> List[str]:
+    try:
+        return _ready_storage().similar_words(get_room_id(), word)
+    except Exception:
+        return []
 
-def load_player_groups_db() -> dict:
-    conn = get_db_connection()
+def import_words_to_db(entries: List[WordEntry]) -> Tuple[List[str], List[str]]:
+    """Alta masiva. Devuelve (añadidas, omitidas por casi-duplicado o error)."""
     rid = get_room_id()
     try:
-        df = conn.query("SELECT group_name, player_names FROM player_groups WHERE room_id = :rid ORDER BY created_at DESC", params={"rid": rid}, ttl=0)
-        groups = {}
-        if not df.empty:
-            for _, row in df.iterrows():
-                groups[row['group_name']] = row['player_names'].split('|')
-        return groups
+        storage = _ready_storage()
     except Exception:
-        return {}
+        return [], [e.word for e in entries]
+
+    # Misma consulta que el alta individual; cada add_word actualiza el índice
+    # del backend, así que también se detectan duplicados dentro del lote
+    added, skipped = [], []
+    for entry in entries:
+        try:
+            if storage.similar_words(rid, entry.word):
+                skipped.append(entry.word)
+                continue
+            storage.add_word(rid, entry.word, entry.stored_hints())
+        except Exception:
+            skipped.append(entry.word)
+            continue
+        added.append(entry.word)
+    if added:
+        _after_write(rid)
+    return added, skipped
 
 def delete_player_group_db(group_name: str):
-    conn = get_db_connection()
     rid = get_room_id()
     try:
-        with conn.session as s:
-            s.execute(text("DELETE FROM player_groups WHERE group_name = :n AND room_id = :rid"), {"n": group_name, "rid": rid})
-            s.commit()
+        _ready_storage().delete_group(rid, group_name)
+    except Exception:
+        return
+    _after_write(rid)
+
+# ╔══════════════════════════════════════════════════════════════╗
+#  MÓDULO DE CACHÉ LOCAL (SNAPSHOTS DE SALA EN DISCO)
+# ╚══════════════════════════════════════════════════════════════╝
+# Cada sala se guarda en un fichero binario compacto que se lee vía mmap:
+#
+#   cabecera  <4s H 16s I I>  magic, formato, versión, nº palabras, nº grupos
+#   offsets   uint32 × (n+1)  inicio de cada registro dentro del pool
+#   pool      UTF-8           campos de cada registro separados por \x1f
+#   niveles   uint8 × nº pal. nivel de dificultad de cada palabra (sin decodificar el pool)
+#
+# Al arrancar se sirve el snapshot al instante y la base de datos se consulta
+# en segundo plano; si la versión (hash del contenido) cambia, se reescribe.
+
+SNAPSHOT_MAGIC   = b"IMPB"
+SNAPSHOT_FORMAT  = 2
+FIELD_SEP        = "\x1f"
+ROOM_BANK_TTL    = 30.0  # segundos entre refrescos en segundo plano por sala
+ROOM_BANK_CAPACITY  = 256   # salas en memoria por proceso (LRU)
+ROOM_SNAPSHOT_LIMIT = 1000  # ficheros room_*.bin en disco (se borran los menos usados)
+ROOM_REFRESH_FAILURE_NOTICE = 2  # refrescos fallidos seguidos antes de avisar
+ROOM_SWITCH_DEBOUNCE = 0.4  # espera antes de consultar una sala recién tecleada
+
+_PACK_HEADER = struct.Struct("<4sH16sII")
+
+
+class PackedRecords:
+    """Registros de texto (tabla de offsets + pool de strings) mapeados en memoria."""
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as fh:
+            self._buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, version, n_primary, n_secondary = _PACK_HEADER.unpack_from(self._buf, 0)
+        if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT:
+            self._buf.close()
+            raise ValueError(f"Snapshot incompatible: {path}")
+        self.version     = version.hex()
+        self.n_primary   = n_primary
+        self.n_secondary = n_secondary
+        n = n_primary + n_secondary
+        self._offsets = memoryview(self._buf)[_PACK_HEADER.size:_PACK_HEADER.size + 4 * (n + 1)].cast("I")
+        self._pool_start = _PACK_HEADER.size + 4 * (n + 1)
+        levels_start = self._pool_start + self._offsets[n]
+        self.levels = memoryview(self._buf)[levels_start:levels_start + n_primary]
+        if len(self.levels) != n_primary:
+            self.close()
+            raise ValueError(f"Snapshot truncado: {path}")
+
+    def __len__(self) -> int:
+        return self.n_primary + self.n_secondary
+
+    def close(self) -> None:
+        self._offsets.release()
+        self.levels.release()
+        self._buf.close()
+
+    def record(self, i: int) -> List[str]:
+        start = self._pool_start + self._offsets[i]
+        end   = self._pool_start + self._offsets[i + 1]
+        return self._buf[start:end].decode("utf-8").split(FIELD_SEP)
+
+
+def records_version(records: List[List[str]]) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for fields in records:
+        digest.update(FIELD_SEP.join(fields).encode("utf-8") + b"\x1e")
+    return digest.digest()
+
+
+def write_packed_records(path: Path, primary: List[List[str]], secondary: List[List[str]] = ()) -> bytes:
+    records = list(primary) + list(secondary)
+    version = records_version(records)
+    # Para el nivel de la palabra basta con la palabra y el primer campo
+    levels = bytes(parse_levels(f[0], f[1:2])[1] for f in primary)
+    offsets, chunks, pos = array("I", [0]), [], 0
+    for fields in records:
+        chunk = FIELD_SEP.join(fields).encode("utf-8")
+        chunks.append(chunk)
+        pos += len(chunk)
+        offsets.append(pos)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(_PACK_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, version, len(primary), len(secondary)))
+        fh.write(offsets.tobytes())
+        fh.write(b"".join(chunks))
+        fh.write(levels)
+    # Reemplazo atómico: los lectores nunca ven un fichero a medias
+    os.replace(tmp, path)
+    return version
+
+
+@dataclass(frozen=True)
+class RoomBank:
+    words: List[WordEntry] = field(default_factory=list)
+    groups: dict = field(default_factory=dict)
+    version: str = ""
+    # Filas guardadas que no pasan la validación actual: (palabra, pistas, motivo)
+    rejected: List[Tuple[str, List[str], str]] = field(default_factory=list)
+    # dificultad -> AliasTable sobre el nivel de cada palabra; se crea con el banco
+    word_tables: dict = field(default=None, init=False, repr=False, compare=False)
+    # False si ninguna palabra ni pista lleva "~N": la dificultad no cambia nada
+    has_levels: bool = field(default=False, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "word_tables", difficulty_tables(e.level for e in self.words))
+        object.__setattr__(self, "has_levels", any(
+            e.level != DEFAULT_LEVEL or any(lv != DEFAULT_LEVEL for lv in e.hint_levels) for e in self.words
+        ))
+
+
+@dataclass
+class ProcessCache:
+    """
+    Estado compartido por todas las sesiones del proceso. Streamlit re-ejecuta
+    app.py en cada rerun, así que las variables globales del módulo no
+    sobreviven: estas cachés se obtienen siempre vía process_state().
+    """
+    entries: dict = field(default_factory=dict)
+    stamps: dict = field(default_factory=dict)
+    failures: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def evict(self, capacity: int) -> None:
+        """Descarta las claves menos usadas (al principio del dict). Llamar con el lock."""
+        while len(self.entries) > capacity:
+            key = next(iter(self.entries))
+            del self.entries[key]
+            self.stamps.pop(key, None)
+            self.failures.pop(key, None)
+
+
+@lazy_cache_resource
+def process_state() -> dict:
+    """
+    Todas las cachés y pools del proceso detrás de un único @st.cache_resource:
+    cada decorador hace un inspect.getsource en cada rerun, así que se paga
+    una vez en lugar de seis.
+    """
+    return {
+        "room_banks":     ProcessCache(),
+        "corpus":         ProcessCache(),
+        "corpus_entries": ProcessCache(),
+        "corpus_tables":  ProcessCache(),
+        # Orquesta refrescos de sala: cada tarea espera su debounce y sus consultas
+        "prefetch": ThreadPoolExecutor(max_workers=4, thread_name_prefix="room-prefetch"),
+        # Consultas sueltas al backend. Va aparte para que una tarea de refresco
+        # que espera a sus consultas nunca ocupe el hilo que debe ejecutarlas.
+        "query":    ThreadPoolExecutor(max_workers=8, thread_name_prefix="room-query"),
+    }
+
+
+def room_bank_cache() -> ProcessCache:
+    # entries: room_id -> RoomBank (orden LRU) · stamps: room_id -> epoch del
+    # último refresco · failures: room_id -> (fallos seguidos, último error)
+    return process_state()["room_banks"]
+
+
+@lru_cache(maxsize=1)
+def snapshot_dir() -> Path:
+    return Path(_storage_setting("snapshot_dir", ".impostor_cache"))
+
+
+def _room_file_hash(room_id: str) -> str:
+    # La clave de sala es un secreto: en disco sólo aparece su hash
+    return hashlib.blake2b(room_id.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def room_snapshot_path(room_id: str) -> Path:
+    return snapshot_dir() / f"room_{_room_file_hash(room_id)}.bin"
+
+
+def _bank_records(words: List[WordEntry], groups: dict, rejected=()):
+    # Las filas rechazadas se guardan tal cual; al leer se vuelven a separar
+    word_records  = [[e.word] + e.stored_hints() for e in words] + [[w] + list(h) for w, h, _ in rejected]
+    group_records = [[name] + list(players) for name, players in groups.items()]
+    return word_records, group_records
+
+
+def write_room_snapshot(room_id: str, bank: RoomBank) -> None:
+    path = room_snapshot_path(room_id)
+    if not (bank.words or bank.groups or bank.rejected):
+        # Sala vacía: nada que servir en frío, y un snapshot viejo mentiría
+        path.unlink(missing_ok=True)
+        return
+    write_packed_records(path, *_bank_records(bank.words, bank.groups, bank.rejected))
+    prune_room_snapshots()
+
+
+def prune_room_snapshots(limit: int = ROOM_SNAPSHOT_LIMIT) -> None:
+    # El mtime hace de marca LRU: read_room_snapshot lo renueva en cada lectura
+    files = []
+    for path in snapshot_dir().glob("room_*.bin"):
+        try:
+            files.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    if len(files) <= limit:
+        return
+    files.sort()
+    for _, path in files[:len(files) - limit]:
+        path.unlink(missing_ok=True)
+
+
+def read_room_snapshot(room_id: str) -> Optional[RoomBank]:
+    path = room_snapshot_path(room_id)
+    try:
+        packed = PackedRecords(path)
+        os.utime(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    try:
+        words, rejected = _word_entries((f[0], f[1:]) for f in map(packed.record, range(packed.n_primary)))
+        groups = {}
+        for i in range(packed.n_primary, len(packed)):
+            fields = packed.record(i)
+            groups[fields[0]] = fields[1:]
+        return RoomBank(words=words, groups=groups, version=packed.version, rejected=rejected)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    finally:
+        packed.close()
+
+
+def prefetch_pool() -> ThreadPoolExecutor:
+    return process_state()["prefetch"]
+
+
+def query_pool() -> ThreadPoolExecutor:
+    return process_state()["query"]
+
+
+@dataclass
+class PrefetchTicket:
+    """Refresco de sala pedido por una sesión; se cancela si llega otro cambio de sala."""
+    room_id: str
+    delay: float = 0.0
+    cancelled: bool = False
+    future: Optional[Future] = None
+
+    def pending(self) -> bool:
+        return self.future is not None and not self.future.done() and not self.cancelled
+
+
+def _note_refresh_failure(cache: ProcessCache, room_id: str, error: Exception) -> None:
+    with cache.lock:
+        count, _ = cache.failures.get(room_id, (0, ""))
+        cache.failures[room_id] = (count + 1, str(error))
+
+
+def refresh_room_bank(room_id: str, storage: Optional[StorageBackend] = None) -> RoomBank:
+    cache = room_bank_cache()
+    try:
+        storage = storage or get_storage()
+        storage.ensure_schema()
+        # Palabras y grupos en paralelo: dos viajes a la BD cuestan uno
+        rows_f   = query_pool().submit(storage.load_word_rows, room_id)
+        groups_f = query_pool().submit(storage.load_groups, room_id)
+        rows, groups = rows_f.result(), groups_f.result()
+    except Exception as e:
+        _note_refresh_failure(cache, room_id, e)
+        raise
+    words, rejected = _word_entries(rows)
+    version = records_version([r for part in _bank_records(words, groups, rejected) for r in part]).hex()
+    bank = RoomBank(words=words, groups=groups, version=version, rejected=rejected)
+
+    with cache.lock:
+        previous = cache.entries.pop(room_id, None)
+        cache.entries[room_id] = bank
+        cache.failures.pop(room_id, None)
+        cache.evict(ROOM_BANK_CAPACITY)
+    if previous is None or previous.version != version:
+        try:
+            write_room_snapshot(room_id, bank)
+        except OSError:
+            pass
+    return bank
+
+
+def _refresh_room_bank_quietly(room_id: str, cache: ProcessCache, ticket: Optional[PrefetchTicket]) -> None:
+    if ticket is not None and ticket.delay:
+        time.sleep(ticket.delay)
+        if ticket.cancelled:
+            # Clave intermedia descartada: sin consulta y sin consumir el TTL
+            with cache.lock:
+                cache.stamps.pop(room_id, None)
+            return
+    try:
+        # El backend también se resuelve aquí: crearlo importa SQLAlchemy y el
+        # driver (~300 ms la primera vez) y no debe retrasar el primer pintado
+        refresh_room_bank(room_id)
     except Exception:
+        # Sin red: se sigue sirviendo el snapshot; se reintenta al vencer el TTL
+        pass
+
+
+def schedule_room_refresh(room_id: str, ticket: Optional[PrefetchTicket] = None) -> Optional[Future]:
+    now = time.time()
+    cache = room_bank_cache()
+    with cache.lock:
+        if now - cache.stamps.get(room_id, 0.0) < ROOM_BANK_TTL:
+            return None
+        cache.stamps[room_id] = now
+    return prefetch_pool().submit(_refresh_room_bank_quietly, room_id, cache, ticket)
+
+
+def get_room_bank(room_id: str, refresh: bool = True) -> RoomBank:
+    """Devuelve el banco de la sala sin esperar a la red (memoria → disco → vacío)."""
+    cache = room_bank_cache()
+    with cache.lock:
+        bank = cache.entries.pop(room_id, None)
+        if bank is not None:
+            cache.entries[room_id] = bank  # al final: usada más recientemente
+    if bank is None:
+        bank = read_room_snapshot(room_id) or RoomBank()
+        with cache.lock:
+            bank = cache.entries.setdefault(room_id, bank)
+            cache.evict(ROOM_BANK_CAPACITY)
+    if refresh:
+        schedule_room_refresh(room_id)
+    return bank
+
+
+def room_refresh_error(room_id: str) -> Optional[str]:
+    """Último error si la sala lleva ROOM_REFRESH_FAILURE_NOTICE refrescos fallidos seguidos."""
+    cache = room_bank_cache()
+    with cache.lock:
+        count, error = cache.failures.get(room_id, (0, ""))
+    return error if count >= ROOM_REFRESH_FAILURE_NOTICE else None
+
+# ╔══════════════════════════════════════════════════════════════╗
+#  MÓDULO DE CORPUS INTEGRADO (CATEGORÍAS EN corpus/*.txt)
+# ╚══════════════════════════════════════════════════════════════╝
+# Cada categoría es un .txt legible (Palabra|pista|pista...) que se compila en
+# su primer uso al mismo formato empaquetado de los snapshots y se abre vía
+# mmap: elegir palabra es O(1) y sólo se decodifica la línea elegida.
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+def corpus_cache() -> ProcessCache:
+    # entries: categoría -> PackedRecords (abierto una vez por proceso)
+    return process_state()["corpus"]
+
+
+def corpus_entry_cache() -> ProcessCache:
+    # entries: (categoría, índice) -> WordEntry, con sus tablas de alias ya hechas
+    return process_state()["corpus_entries"]
+
+
+def corpus_table_cache() -> ProcessCache:
+    # entries: categoría -> {dificultad: AliasTable sobre el nivel de cada palabra}
+    return process_state()["corpus_tables"]
+
+
+@lru_cache(maxsize=1)
+def corpus_categories() -> List[str]:
+    return sorted(p.stem for p in CORPUS_DIR.glob("*.txt"))
+
+
+@lru_cache(maxsize=None)
+def category_label(category: str) -> str:
+    # Nombre legible desde la cabecera "# Categoría: ..." del fichero fuente
+    with open(CORPUS_DIR / f"{category}.txt", encoding="utf-8") as fh:
+        first = fh.readline().strip()
+    if first.startswith("# Categoría:"):
+        return first.split(":", 1)[1].strip()
+    return category.replace("_", " ").capitalize()
+
+
+def _parse_corpus_source(path: Path) -> List[List[str]]:
+    records = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = [f.strip() for f in line.split("|") if f.strip()]
+        if not fields:
+            continue
+        try:
+            entry = WordEntry(word=fields[0], hints=fields[1:])  # valida al compilar, no al jugar
+        except ValueError:
+            # Igual que _word_entries: una línea mala no deja sin categoría
+            continue
+        records.append([entry.word] + entry.stored_hints())
+    return records
+
+
+def open_corpus_category(category: str) -> PackedRecords:
+    cache = corpus_cache()
+    with cache.lock:
+        packed = cache.entries.get(category)
+    if packed is not None:
+        return packed
+
+    source = CORPUS_DIR / f"{category}.txt"
+    stat = source.stat()
+    compiled = snapshot_dir() / f"corpus_{category}_v{SNAPSHOT_FORMAT}_{stat.st_size:x}_{stat.st_mtime_ns:x}.bin"
+    if not compiled.exists():
+        write_packed_records(compiled, _parse_corpus_source(source))
+
+    packed = PackedRecords(compiled)
+    with cache.lock:
+        winner = cache.entries.setdefault(category, packed)
+    if winner is not packed:
+        packed.close()
+    return winner
+
+
+def corpus_entry(category: str, index: int) -> WordEntry:
+    cache = corpus_entry_cache()
+    with cache.lock:
+        entry = cache.entries.get((category, index))
+    if entry is None:
+        fields = open_corpus_category(category).record(index)
+        entry = WordEntry(word=fields[0], hints=fields[1:])
+        with cache.lock:
+            entry = cache.entries.setdefault((category, index), entry)
+    return entry
+
+
+def corpus_word_tables(category: str) -> dict:
+    cache = corpus_table_cache()
+    with cache.lock:
+        tables = cache.entries.get(category)
+    if tables is None:
+        # Niveles guardados al compilar: no se decodifica ninguna línea
+        levels = open_corpus_category(category).levels
+        with cache.lock:
+            tables = cache.entries.setdefault(category, difficulty_tables(levels))
+    return tables
+
+
+def sample_corpus_entry(categories: List[str], difficulty: str = "normal") -> Optional[Tuple[str, int, WordEntry]]:
+    """Elige (categoría, índice, entrada) entre las categorías pedidas según la dificultad."""
+    available = corpus_categories()
+    chosen = [c for c in categories if c in available] or available
+    try:
+        banks = [(c, corpus_word_tables(c)[difficulty]) for c in chosen]
+    except (OSError, ValueError):
+        return None
+
+    weights = [table.total for _, table in banks]
+    if not sum(weights):
+        return None
+    category, table = random.choices(banks, weights=weights)[0]
+    index = table.sample()
+    return category, index, corpus_entry(category, index)
+
+# ╔══════════════════════════════════════════════════════════════╗
+#  MÓDULO DE SNAPSHOTS DE PARTIDA (REANUDAR TRAS RECONEXIÓN)
+# ╚══════════════════════════════════════════════════════════════╝
+# Si el móvil se bloquea o cae el WebSocket, st.session_state se pierde. Cada
+# change_state escribe un snapshot binario de unos cientos de bytes por sala:
+#
+#   cabecera  <4s B B B H H H H d d>  magic, formato, fase, flags, nº impostores,
+#                                     jugador actual, nº jugadores, quien empieza,
+#                                     inicio de ronda, guardado en
+#   palabra   <B I 16s> + str         origen, índice, versión del banco, categoría
+#   roles     bitset                  bit i = jugador i es impostor
+#   pistas    uint8 por impostor      índice en entry.hints (255 = sin pista)
+#   nombres   str × n, categorías     str = longitud uint16 + UTF-8
+#
+# La palabra se guarda como referencia: si el banco cambió de versión no se
+# puede reanudar y se vuelve al setup.
+#
+# El fichero se indexa por sala + token de dispositivo (?d=... en la URL): en
+# la sala compartida 'public' cada móvil sólo ve y pisa su propia partida.
+
+GAME_SNAPSHOT_MAGIC   = b"IMPG"
+GAME_SNAPSHOT_FORMAT  = 3
+GAME_SNAPSHOT_MAX_AGE = 3 * 3600.0  # segundos
+NO_HINT = 255
+
+WORD_SOURCE_DEFAULT = 0
+WORD_SOURCE_CORPUS  = 1
+WORD_SOURCE_CUSTOM  = 2
+
+GAME_PHASES = [STATE_SETUP, STATE_CUSTOM_WORDS, STATE_ROLE_DIST, STATE_GAME_ACTIVE, STATE_VOTING]
+
+PHASE_LABELS = {
+    STATE_ROLE_DIST:   "repartiendo roles",
+    STATE_GAME_ACTIVE: "en discusión",
+    STATE_VOTING:      "en votación",
+}
+
+_GAME_HEADER = struct.Struct("<4sBBBHHHHdd")  # el setup no limita el nº de jugadores
+_WORD_REF    = struct.Struct("<BI16s")
+
+FLAG_HINTS, FLAG_CUSTOM, FLAG_CHAOS, FLAG_REVEALED = 1, 2, 4, 8  # bits de la cabecera
+DIFFICULTY_SHIFT = 4  # bits 4-5: índice de la dificultad en DIFFICULTY_WEIGHTS
+
+
+def _pack_str(value: str) -> bytes:
+    raw = value.encode("utf-8")
+    return struct.pack("<H", len(raw)) + raw
+
+
+def _unpack_str(buf: bytes, pos: int) -> Tuple[str, int]:
+    (size,) = struct.unpack_from("<H", buf, pos)
+    pos += 2
+    return buf[pos:pos + size].decode("utf-8"), pos + size
+
+
+def device_token() -> str:
+    # Se guarda en la URL, así que sobrevive a recargas y reconexiones del socket
+    token = st.query_params.get("d", "")
+    if not re.fullmatch(r"[0-9a-f]{16}", token):
+        token = os.urandom(8).hex()
+        st.query_params["d"] = token
+    return token
+
+
+def game_snapshot_path(room_id: str, token: str) -> Path:
+    return snapshot_dir() / f"game_{_room_file_hash(f'{room_id}{FIELD_SEP}{token}')}.bin"
+
+
+def encode_game_snapshot(phase: str, config: GameConfig, state: GameState) -> bytes:
+    entry = state.selected_word_entry
+    source, index, version, category = state.word_ref or (WORD_SOURCE_DEFAULT, 0, "", "")
+    players = state.players
+    flags = ((FLAG_HINTS if config.hints_enabled else 0) | (FLAG_CUSTOM if config.custom_mode else 0)
+             | (FLAG_CHAOS if config.chaos_mode else 0) | (FLAG_REVEALED if state.reveal_done else 0)
+             | list(DIFFICULTY_WEIGHTS).index(config.difficulty) << DIFFICULTY_SHIFT)
+    starter = next((i for i, p in enumerate(players) if p.name == state.starting_player_name), 0)
+
+    roles = bytearray((len(players) + 7) // 8)
+    hints = bytearray()
+    for i, p in enumerate(players):
+        if p.is_impostor:
+            roles[i // 8] |= 1 << (i % 8)
+            hints.append(entry.hints.index(p.hint) if p.hint in entry.hints else NO_HINT)
+
+    parts = [
+        _GAME_HEADER.pack(GAME_SNAPSHOT_MAGIC, GAME_SNAPSHOT_FORMAT, GAME_PHASES.index(phase), flags,
+                          config.impostor_count, state.current_player_index, len(players), starter,
+                          state.round_start_time or 0.0, time.time()),
+        _WORD_REF.pack(source, index, bytes.fromhex(version) if version else bytes(16)),
+        _pack_str(category), bytes(roles), bytes(hints),
+    ]
+    parts += [_pack_str(p.name) for p in players]
+    parts.append(struct.pack("<B", len(config.categories)))
+    parts += [_pack_str(c) for c in config.categories]
+    return b"".join(parts)
+
+
+def _resolve_word_ref(source: int, index: int, version: str, category: str, room_id: str) -> Optional[WordEntry]:
+    if source == WORD_SOURCE_DEFAULT:
+        return default_dataset()[index] if index < len(DEFAULT_WORDS) else None
+    if source == WORD_SOURCE_CORPUS:
+        if category not in corpus_categories():
+            return None
+        packed = open_corpus_category(category)
+        if packed.version != version or index >= packed.n_primary:
+            return None
+        return corpus_entry(category, index)
+    bank = get_room_bank(room_id, refresh=False)
+    if bank.version != version or index >= len(bank.words):
+        return None
+    return bank.words[index]
+
+
+def decode_game_snapshot(buf: bytes, room_id: str,
+                         max_age: Optional[float] = GAME_SNAPSHOT_MAX_AGE) -> Optional[Tuple[str, GameConfig, GameState]]:
+    (magic, fmt, phase, flags, impostor_count, current, n, starter,
+     round_start, saved_at) = _GAME_HEADER.unpack_from(buf, 0)
+    if magic != GAME_SNAPSHOT_MAGIC or fmt != GAME_SNAPSHOT_FORMAT:
+        return None
+    if max_age is not None and time.time() - saved_at > max_age:
+        return None
+    pos = _GAME_HEADER.size
+    source, index, version = _WORD_REF.unpack_from(buf, pos)
+    pos += _WORD_REF.size
+    category, pos = _unpack_str(buf, pos)
+    version = version.hex() if any(version) else ""
+    roles = buf[pos:pos + (n + 7) // 8]
+    pos += (n + 7) // 8
+    is_impostor = [bool(roles[i // 8] & (1 << (i % 8))) for i in range(n)]
+    hints = buf[pos:pos + sum(is_impostor)]
+    pos += sum(is_impostor)
+    names = []
+    for _ in range(n):
+        name, pos = _unpack_str(buf, pos)
+        names.append(name)
+    n_categories, pos = buf[pos], pos + 1
+    categories = []
+    for _ in range(n_categories):
+        cat, pos = _unpack_str(buf, pos)
+        categories.append(cat)
+
+    entry = _resolve_word_ref(source, index, version, category, room_id)
+    if entry is None:
+        return None
+
+    players, hint_iter = [], iter(hints)
+    for i, (name, imp) in enumerate(zip(names, is_impostor)):
+        if imp:
+            h = next(hint_iter)
+            players.append(Player(id=i + 1, name=name, is_impostor=True, hint=entry.hints[h] if h != NO_HINT else None))
+        else:
+            players.append(Player(id=i + 1, name=name, is_impostor=False, word=entry.word))
+
+    config = GameConfig(
+        player_names   = names,
+        impostor_count = impostor_count,
+        hints_enabled  = bool(flags & FLAG_HINTS),
+        custom_mode    = bool(flags & FLAG_CUSTOM),
+        chaos_mode     = bool(flags & FLAG_CHAOS),
+        categories     = categories,
+        difficulty     = list(DIFFICULTY_WEIGHTS)[(flags >> DIFFICULTY_SHIFT) & 3],
+    )
+    state = GameState(
+        players              = players,
+        current_player_index = current,
+        selected_word_entry  = entry,
+        round_start_time     = round_start or None,
+        starting_player_name = names[starter] if names else None,
+        reveal_done          = bool(flags & FLAG_REVEALED),
+        word_ref             = (source, index, version, category),
+    )
+    return GAME_PHASES[phase], config, state
+
+
+def save_game_snapshot() -> None:
+    phase = st.session_state.current_state
+    path = game_snapshot_path(get_room_id(), device_token())
+    try:
+        state = st.session_state.game_state
+        if phase in (STATE_SETUP, STATE_CUSTOM_WORDS) or not state.players or state.word_ref is None:
+            path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(encode_game_snapshot(phase, st.session_state.game_config, state))
+        os.replace(tmp, path)
+    except (OSError, struct.error):
+        # struct.error: un campo no cabe (nombre de >64 KB...); la partida sigue sin snapshot
         pass
 
+
+def load_game_snapshot(room_id: str, token: str) -> Optional[Tuple[str, GameConfig, GameState]]:
+    try:
+        return decode_game_snapshot(game_snapshot_path(room_id, token).read_bytes(), room_id)
+    except (OSError, ValueError, IndexError, StopIteration, struct.error, UnicodeDecodeError):
+        return None
+
+
+def resume_game(snapshot: Tuple[str, GameConfig, GameState]) -> None:
+    phase, config, state = snapshot
+    st.session_state.game_config   = config
+    st.session_state.game_state    = state
+    st.session_state.current_state = phase
+
+
+# ╔══════════════════════════════════════════════════════════════╗
+#  MÓDULO DE TRAZAS DE LA FSM (OPT-IN)
+# ╚══════════════════════════════════════════════════════════════╝
+# Con IMPOSTOR_TRACE=1 o ?trace=1 en la URL, cada sesión guarda en un buffer
+# circular los eventos de la máquina de estados:
+#
+#   rerun       fase que se va a pintar + snapshot de la partida (hex)
+#   render      milisegundos que tardó el renderer de esa fase
+#   transition  change_state(from → to)
+#
+# La traza se descarga como JSONL desde el propio panel y
+# `tools/replay_trace.py` la vuelve a ejecutar sin navegador para perfilarla.
+
+TRACE_CAPACITY = 2000  # eventos por sesión
+
+
+def tracing_enabled() -> bool:
+    if "trace" not in st.session_state:
+        enabled = os.environ.get("IMPOSTOR_TRACE", "") not in ("", "0") or st.query_params.get("trace") == "1"
+        st.session_state.trace = deque(maxlen=TRACE_CAPACITY) if enabled else None
+    return st.session_state.trace is not None
+
+
+def trace_event(event: str, **data) -> None:
+    if not tracing_enabled():
+        return
+    st.session_state.trace.append({"ts": round(time.time(), 4), "event": event, **data})
+
+
+def trace_rerun() -> None:
+    if not tracing_enabled():
+        return
+    phase = st.session_state.current_state
+    state: GameState = st.session_state.game_state
+    snapshot = None
+    if phase not in (STATE_SETUP, STATE_CUSTOM_WORDS) and state.players and state.word_ref is not None:
+        try:
+            snapshot = encode_game_snapshot(phase, st.session_state.game_config, state).hex()
+        except struct.error:
+            pass
+    trace_event("rerun", phase=phase, snapshot=snapshot)
+
+
+def run_renderer(phase: str, renderer) -> None:
+    # st.rerun() sale del renderer con una excepción: el tiempo se apunta igual
+    profiler = st.session_state.get("trace_profiler")  # lo inyecta replay_trace.py
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.runcall(renderer)
+        else:
+            renderer()
+    finally:
+        trace_event("render", phase=phase, ms=round((time.perf_counter() - start) * 1000, 3))
+
+
+def traced_fragment(func):
+    """
+    @st.fragment que además apunta sus reruns propios en la traza: main() no
+    se ejecuta cuando sólo se relanza un fragmento, y sin esto el setup (la
+    pantalla con más reruns) apenas aparecería. Los eventos llevan `fragment`.
+    """
+    @wraps(func)
+    def body(*args, **kwargs):
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        if not tracing_enabled() or ctx is None or not ctx.fragment_ids_this_run:
+            return func(*args, **kwargs)  # rerun completo: ya lo apunta main()
+        phase = st.session_state.current_state
+        trace_event("rerun", phase=phase, fragment=func.__name__, snapshot=None)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            trace_event("render", phase=phase, fragment=func.__name__,
+                        ms=round((time.perf_counter() - start) * 1000, 3))
+
+    return st.fragment(body)
+
+
+def trace_jsonl() -> str:
+    return "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in st.session_state.trace or ())
+
+
+def render_trace_panel() -> None:
+    events = st.session_state.trace
+    with st.expander(f"&#128300; Traza ({len(events)} eventos)"):
+        reruns = {}
+        for e in events:
+            if e["event"] == "rerun":
+                reruns[e["phase"]] = reruns.get(e["phase"], 0) + 1
+        st.caption(" · ".join(f"{phase}: {n} reruns" for phase, n in reruns.items()) or "Sin eventos")
+        st.download_button(
+            "Descargar JSONL", trace_jsonl(),
+            file_name=f"impostor_trace_{int(time.time())}.jsonl", mime="application/jsonl",
+        )
+
+
 # ╔══════════════════════════════════════════════════════════════╗
 #  SECCIÓN 5 — INIT SESSION STATE
 # ╚══════════════════════════════════════════════════════════════╝
@@ -359,24 +1735,51 @@ def init_session_state() -> None:
         "game_config":    GameConfig(),
         "game_state":     GameState(),
         "custom_dataset": [],
-        "db_initialized": False,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
+    device_token()  # fija ?d=... en la URL desde la primera carga
+
+    # Snapshot local al instante; la base de datos se consulta en segundo plano
+    # y el resultado aparece en el siguiente rerun.
+    rid = get_room_id()
+    if "room_prefetch" not in st.session_state:
+        ticket = PrefetchTicket(rid)
+        ticket.future = schedule_room_refresh(rid, ticket)
+        st.session_state.room_prefetch = ticket
+    else:
+        schedule_room_refresh(rid)
+    st.session_state.custom_dataset = get_room_bank(rid, refresh=False).words
 
-    if not st.session_state.db_initialized:
-        init_db()
-        st.session_state.db_initialized = True
 
-    if not st.session_state.custom_dataset:
-        db_words = load_words_from_db()
-        if db_words:
-            st.session_state.custom_dataset = db_words
+def switch_room(room_key: str) -> None:
+    """Cambia de sala sin bloquear: datos locales ya, BD tras el debounce."""
+    previous: Optional[PrefetchTicket] = st.session_state.get("room_prefetch")
+    if previous is not None:
+        previous.cancelled = True
+    st.session_state.room_id = room_key
+    rid = get_room_id()
+    ticket = PrefetchTicket(rid, delay=ROOM_SWITCH_DEBOUNCE)
+    ticket.future = schedule_room_refresh(rid, ticket)
+    st.session_state.room_prefetch = ticket
+    st.session_state.custom_dataset = get_room_bank(rid, refresh=False).words
+
+
+@st.fragment(run_every=0.5)
+def room_prefetch_watcher(ticket: PrefetchTicket) -> None:
+    # Sólo se pinta mientras hay un refresco en curso; al terminar relanza la
+    # página completa para mostrar los datos recién llegados.
+    if ticket.pending():
+        st.caption("&#8987; Sincronizando sala…")
+    else:
+        st.rerun()
 
 
 def change_state(s: str) -> None:
+    trace_event("transition", source=st.session_state.current_state, target=s)
     st.session_state.current_state = s
+    save_game_snapshot()
 
 # ╔══════════════════════════════════════════════════════════════╗
 #  SECCIÓN 6 — LÓGICA DE NEGOCIO
@@ -403,7 +1806,9 @@ def build_players(config: GameConfig, entry: WordEntry) -> List[Player]:
     pool = entry.hints.copy()
     impostor_total = sum(roles)
     sample_size = min(impostor_total, len(pool)) if impostor_total > 0 else 0
-    unique_hints = random.sample(pool, sample_size)
+    # Tabla de alias precalculada en la WordEntry para la dificultad elegida
+    table = entry.hint_tables[config.difficulty]
+    unique_hints = [pool[i] for i in table.sample_distinct(sample_size)]
     
     while len(unique_hints) < impostor_total:
         remaining = [h for h in pool if h not in unique_hints[-len(pool):]] or pool.copy()
@@ -422,27 +1827,244 @@ def build_players(config: GameConfig, entry: WordEntry) -> List[Player]:
     return players
 
 
-def start_role_distribution() -> None:
-    config: GameConfig = st.session_state.game_config
-    state:  GameState  = st.session_state.game_state
-
-    dataset = st.session_state.custom_dataset if config.custom_mode else []
-    if not dataset:
-        dataset = DEFAULT_DATASET
-
-    entry = random.choice(dataset)
+def deal_round(config: GameConfig, bank: Optional[RoomBank] = None) -> GameState:
+    """Reparte una ronda completa sin tocar st.session_state (válido en otro hilo)."""
+    state = GameState()
+    if config.custom_mode and bank is not None and bank.words:
+        index = bank.word_tables[config.difficulty].sample()
+        entry = bank.words[index]
+        state.word_ref = (WORD_SOURCE_CUSTOM, index, bank.version, "")
+    else:
+        picked = sample_corpus_entry(config.categories, config.difficulty)
+        if picked:
+            category, index, entry = picked
+            state.word_ref = (WORD_SOURCE_CORPUS, index, open_corpus_category(category).version, category)
+        else:
+            index = random.randrange(len(DEFAULT_WORDS))
+            entry = default_dataset()[index]
+            state.word_ref = (WORD_SOURCE_DEFAULT, index, "", "")
     state.selected_word_entry  = entry
     state.players              = build_players(config, entry)
-    state.current_player_index = 0
-    state.round_start_time     = None
     state.starting_player_name = random.choice(state.players).name
-    state.reveal_done          = False
+    return state
+
+
+def _round_bank(config: GameConfig) -> Optional[RoomBank]:
+    # Banco del que saldría la próxima palabra (sólo en modo personalizado)
+    return get_room_bank(get_room_id(), refresh=False) if config.custom_mode else None
+
+
+def start_role_distribution(state: Optional[GameState] = None) -> None:
+    if state is None:
+        config: GameConfig = st.session_state.game_config
+        state = deal_round(config, _round_bank(config))
+    st.session_state.game_state = state
     change_state(STATE_ROLE_DIST)
 
+
+# ── RONDA ESPECULATIVA: se reparte mientras se muestra la revelación ──
+
+def _next_round_key(config: GameConfig) -> Tuple[str, str, str]:
+    bank = _round_bank(config)
+    return repr(config), get_room_id(), bank.version if bank is not None else ""
+
+
+def schedule_next_round() -> None:
+    config: GameConfig = st.session_state.game_config
+    key = _next_round_key(config)
+    pending = st.session_state.get("next_round")
+    if pending is not None and pending[0] == key:
+        return
+    st.session_state.next_round = (key, prefetch_pool().submit(deal_round, config, _round_bank(config)))
+
+
+def take_next_round() -> Optional[GameState]:
+    """La ronda precalculada si sigue siendo válida (misma config y banco); si no, None."""
+    pending = st.session_state.pop("next_round", None)
+    if pending is None:
+        return None
+    key, future = pending
+    if key != _next_round_key(st.session_state.game_config) or not future.done() or future.exception():
+        return None
+    return future.result()
+
+
+# ── MODO TORNEO: muchas mesas en una sola pasada vectorizada ──
+
+def _np():
+    import numpy
+    return numpy
+
+
+def _level_picks(levels: list, difficulty: str, count: int, rng) -> List[Tuple[int, int]]:
+    """
+    (bloque, índice) para `count` mesas sobre varios bloques de niveles de
+    palabra, con los mismos pesos que deal_round (DIFFICULTY_WEIGHTS).
+    """
+    np = _np()
+    by_level = np.array([0.0] + [DIFFICULTY_WEIGHTS[difficulty][lv] for lv in (1, 2, 3)])
+    weights = [by_level[np.asarray(block, dtype=np.uint8)] for block in levels]
+    sizes = np.array([len(w) for w in weights])
+    bounds = np.cumsum(sizes)
+    cumulative = np.cumsum(np.concatenate(weights))
+    picks = np.searchsorted(cumulative, rng.random(count) * cumulative[-1], side="right")
+    which = np.searchsorted(bounds, picks, side="right")
+    local = picks - (bounds[which] - sizes[which])
+    return list(zip(which.tolist(), local.tolist()))
+
+
+def _corpus_picks(categories: List[str], difficulty: str, count: int, rng) -> List[Tuple[str, int]]:
+    """(categoría, índice) para `count` mesas con el mismo filtro de categorías y dificultad."""
+    available = corpus_categories()
+    chosen = [c for c in categories if c in available] or available
+    # Niveles del corpus compilado: no se decodifica ninguna línea
+    levels = [open_corpus_category(c).levels for c in chosen]
+    return [(chosen[c], i) for c, i in _level_picks(levels, difficulty, count, rng)]
+
+
+class TournamentDeal:
+    """
+    Reparto de varias mesas calculado con matrices (mesa × jugador). Los
+    `Player` de cada mesa sólo se construyen al pedirla, y cada palabra se
+    valida como `WordEntry` una única vez aunque salga en varias mesas.
+    """
+
+    def __init__(self, configs: List[GameConfig], word_keys: list, records: dict, word_refs: list,
+                 impostor, hint_index, starters) -> None:
+        self.configs    = configs
+        self.impostor   = impostor    # bool (mesas, max_jugadores)
+        self.hint_index = hint_index  # int  (mesas, max_jugadores), -1 = sin pista
+        self.starters   = starters    # int  (mesas,)
+        self._word_keys = word_keys   # clave de palabra por mesa
+        self._records   = records     # clave -> WordEntry
+        self._word_refs = word_refs
+        self._tables: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.configs)
+
+    def entry(self, t: int) -> WordEntry:
+        return self._records[self._word_keys[t]]
+
+    def table(self, t: int) -> GameState:
+        state = self._tables.get(t)
+        if state is None:
+            entry = self.entry(t)
+            names = self.configs[t].player_names
+            roles = self.impostor[t, :len(names)].tolist()
+            hints = self.hint_index[t, :len(names)].tolist()
+            players = [
+                Player(id=i + 1, name=name, is_impostor=True, hint=entry.hints[h] if h >= 0 else None)
+                if is_imp else Player(id=i + 1, name=name, is_impostor=False, word=entry.word)
+                for i, (name, is_imp, h) in enumerate(zip(names, roles, hints))
+            ]
+            state = GameState(
+                players              = players,
+                selected_word_entry  = entry,
+                starting_player_name = names[int(self.starters[t])],
+                word_ref             = self._word_refs[t],
+            )
+            self._tables[t] = state
+        return state
+
+    def __iter__(self):
+        return (self.table(t) for t in range(len(self)))
+
+
+def deal_tournament(configs: List[GameConfig], dataset: Optional[List[WordEntry]] = None,
+                    rng=None, bank: Optional[RoomBank] = None) -> TournamentDeal:
+    """
+    Reparte todas las mesas a la vez. Con `dataset` todas las mesas sacan la
+    palabra de esa lista; sin él, igual que deal_round: las mesas en modo
+    personalizado del banco de sala `bank` (si tiene palabras) y el resto del
+    corpus según sus categorías.
+    """
+    if not configs:
+        raise ValueError("El torneo necesita al menos una mesa.")
+    np = _np()
+    rng = rng if rng is not None else np.random.default_rng()
+    n_tables = len(configs)
+    if not dataset and not corpus_categories():
+        dataset = default_dataset()
+    sizes  = np.array([c.total_players for c in configs])
+    counts = np.array([c.impostor_count for c in configs])
+    width  = int(sizes.max())
+    seat   = np.arange(width)
+    valid  = seat < sizes[:, None]
+
+    # Palabras: un índice por mesa; sólo se decodifican las líneas elegidas
+    if dataset:
+        word_keys = rng.integers(len(dataset), size=n_tables).tolist()
+        records = {i: dataset[i] for i in set(word_keys)}
+        source = WORD_SOURCE_DEFAULT if dataset is default_dataset() else None
+        word_refs = [(source, i, "", "") if source is not None else None for i in word_keys]
+    else:
+        word_keys, word_refs, records = [None] * n_tables, [None] * n_tables, {}
+        groups: dict = {}
+        custom_words = bank.words if bank is not None else []
+        for t, config in enumerate(configs):
+            custom = config.custom_mode and bool(custom_words)
+            groups.setdefault((custom, tuple(config.categories), config.difficulty), []).append(t)
+        for (custom, categories, difficulty), tables in groups.items():
+            if custom:
+                levels = [[e.level for e in custom_words]]
+                for t, (_, index) in zip(tables, _level_picks(levels, difficulty, len(tables), rng)):
+                    # Clave (None, índice): palabra del banco de sala, no del corpus
+                    records.setdefault((None, index), custom_words[index])
+                    word_keys[t] = (None, index)
+                    word_refs[t] = (WORD_SOURCE_CUSTOM, index, bank.version, "")
+                continue
+            for t, key in zip(tables, _corpus_picks(list(categories), difficulty, len(tables), rng)):
+                category, index = key
+                packed = open_corpus_category(category)
+                if key not in records:
+                    # corpus_entry comparte la entrada validada con deal_round
+                    # y con el resto de torneos del proceso
+                    records[key] = corpus_entry(category, index)
+                word_keys[t] = key
+                word_refs[t] = (WORD_SOURCE_CORPUS, index, packed.version, category)
+
+    # Roles: el rango de cada asiento en una permutación aleatoria por fila
+    keys = np.where(valid, rng.random((n_tables, width)), np.inf)
+    rank = keys.argsort(axis=1).argsort(axis=1)
+    impostor = rank < counts[:, None]
+
+    chaos = np.array([c.chaos_mode for c in configs]) & (rng.random(n_tables) < 0.20)
+    all_impostors = rng.random(n_tables) < 0.5
+    impostor = np.where(chaos[:, None], all_impostors[:, None] & valid, impostor)
+
+    # Pistas: permutación ponderada por dificultad de las pistas de cada
+    # palabra (claves -ln(U)/peso, Efraimidis–Spirakis); el impostor j-ésimo
+    # toma la j-ésima (y se recicla si hay más impostores que pistas)
+    hint_levels = {k: r.hint_levels for k, r in records.items()}
+    n_hints = np.array([len(hint_levels[k]) for k in word_keys])
+    hint_width = int(n_hints.max())
+    weight_rows: dict = {}
+    for k, c in zip(word_keys, configs):
+        if (k, c.difficulty) not in weight_rows:
+            row = [DIFFICULTY_WEIGHTS[c.difficulty][lv] for lv in hint_levels[k]]
+            weight_rows[k, c.difficulty] = row + [1.0] * (hint_width - len(row))
+    hint_weights = np.array([weight_rows[k, c.difficulty] for k, c in zip(word_keys, configs)])
+    hint_keys = np.where(np.arange(hint_width) < n_hints[:, None],
+                         -np.log(1.0 - rng.random((n_tables, hint_width))) / hint_weights, np.inf)
+    hint_perm = hint_keys.argsort(axis=1)
+    ordinal = np.cumsum(impostor, axis=1) - 1
+    hint_index = np.take_along_axis(hint_perm, ordinal.clip(min=0) % n_hints[:, None], axis=1)
+    with_hints = np.array([c.hints_enabled for c in configs])
+    hint_index = np.where(impostor & with_hints[:, None], hint_index, -1)
+
+    starters = (rng.random(n_tables) * sizes).astype(int)
+    return TournamentDeal(configs, word_keys, records, word_refs, impostor, hint_index, starters)
+
 # ╔══════════════════════════════════════════════════════════════╗
 #  SECCIÓN 7 — HTML COMPONENTS (iframe-rendered, sin limitaciones)
 # ╚══════════════════════════════════════════════════════════════╝
 
+def _components():
+    import streamlit.components.v1 as components
+    return components
+
+
 def flip_card_component(player: Player, hints_enabled: bool) -> None:
     """
     Renderiza la tarjeta flip en un iframe con components.html().
@@ -559,7 +2181,7 @@ def flip_card_component(player: Player, hints_enabled: bool) -> None:
 </div>
 </body>
 </html>"""
-    components.html(html, height=360)
+    _components().html(html, height=360)
 
 
 def timer_component(start_epoch: float) -> None:
@@ -590,41 +2212,69 @@ tick();setInterval(tick,1000);
 </script>
 </body>
 </html>"""
-    components.html(html, height=100)
+    _components().html(html, height=100)
 
 # ╔══════════════════════════════════════════════════════════════╗
 #  SECCIÓN 8 — PANTALLAS
 # ╚══════════════════════════════════════════════════════════════╝
 
-def render_setup() -> None:
-    st.markdown(GLOBAL_PAGE_CSS, unsafe_allow_html=True)
+SETUP_OPTION_DEFAULTS = {
+    "opt_impostors":  1,
+    "opt_hints":      True,
+    "opt_chaos":      False,
+    "opt_custom":     False,
+    "opt_categories": [],
+    "opt_difficulty": "normal",
+}
 
-    st.markdown("""
-    <div class="hero-wrap">
-        <div class="hero-el">EL</div>
-        <span class="hero-impostor">IMPOSTOR</span>
-        <div class="hero-sub">El juego de engaño y deducción social</div>
-    </div>
-    """, unsafe_allow_html=True)
 
-    st.markdown("---")
+def _setup_player_names() -> List[str]:
+    raw = st.session_state.get("selected_group_names", "")
+    return [n.strip() for n in raw.strip().splitlines() if n.strip()]
+
+
+def render_storage_notice() -> None:
+    error = room_refresh_error(get_room_id())
+    if error:
+        st.warning(f"No se puede conectar con la base de datos; se muestran los datos guardados en local y los cambios pueden no guardarse. ({error})")
+
+
+# Cada bloque del setup es un fragmento: tocar un widget sólo re-ejecuta su
+# bloque. Lo que afecta a otros bloques (cambio de sala, cargar un grupo, nº
+# de jugadores) relanza la página completa con st.rerun().
+
+@traced_fragment
+def setup_room_section() -> None:
     c_key, c_info = st.columns([2,1])
     with c_key:
         # Input para la clave de sala
         room_key = st.text_input("🔑 Tu Clave Secreta (Sala)", value=st.session_state.get("room_id", ""), type="password", help="Usa una clave única para guardar tus datos en privado.")
         if room_key != st.session_state.get("room_id", ""):
-            st.session_state.room_id = room_key
-            st.session_state.custom_dataset = load_words_from_db()
+            switch_room(room_key)
             st.rerun()
+        ticket: Optional[PrefetchTicket] = st.session_state.get("room_prefetch")
+        if ticket is not None and ticket.pending():
+            room_prefetch_watcher(ticket)
     with c_info:
         st.info("Si pones una clave, tus palabras y grupos serán privados y nadie más podrá verlos ni borrarlos.")
+    render_storage_notice()
 
-    # ── GESTIÓN DE GRUPOS DE JUGADORES ──
-    saved_groups = load_player_groups_db() 
+    # ── PARTIDA INTERRUMPIDA (reconexión) ──
+    snapshot = load_game_snapshot(get_room_id(), device_token())
+    if snapshot is not None:
+        phase, _, saved = snapshot
+        c_msg, c_btn = st.columns([2, 1])
+        with c_msg:
+            st.warning(f"Hay una partida a medias en esta sala ({len(saved.players)} jugadores, {PHASE_LABELS[phase]}).")
+        with c_btn:
+            if st.button("&#9199; Reanudar partida", type="primary", use_container_width=True):
+                resume_game(snapshot); st.rerun()
+
+
+@traced_fragment
+def setup_groups_section() -> None:
+    saved_groups = get_room_bank(get_room_id(), refresh=False).groups
 
-    if "selected_group_names" not in st.session_state:
-        st.session_state.selected_group_names = "Ana\nBerto\nCarla\nDavid"
-    
     with st.expander("&#128190; Cargar / Guardar Grupo de Jugadores", expanded=False):
         c1, c2 = st.columns([2, 1])
         with c1:
@@ -646,7 +2296,7 @@ def render_setup() -> None:
             new_group_name = st.text_input("Guardar actuales como:", placeholder="Ej: Familia Domingos", label_visibility="collapsed")
         with c4:
             if st.button("Guardar", use_container_width=True):
-                current_list = [x.strip() for x in st.session_state.selected_group_names.splitlines() if x.strip()]
+                current_list = _setup_player_names()
                 if len(current_list) < 3:
                     st.error("Mínimo 3 jugadores")
                 elif not new_group_name:
@@ -655,18 +2305,19 @@ def render_setup() -> None:
                     save_player_group_db(new_group_name, current_list)
                     st.success(f"Grupo '{new_group_name}' guardado.")
                     time.sleep(1) # Pequeña pausa para ver el mensaje
-                    st.rerun()
+                    st.rerun(scope="fragment")
                     
         # Borrar grupo
         if selected_group and selected_group != "-- Seleccionar --":
             if st.button(f"Borrar grupo '{selected_group}'", type="secondary"):
                 delete_player_group_db(selected_group)
-                st.rerun()
+                st.rerun(scope="fragment")
 
-    # ── JUGADORES ──
+
+@traced_fragment
+def setup_players_section() -> None:
     st.markdown('<div class="section-header">&#128101; JUGADORES</div>', unsafe_allow_html=True)
     st.caption("Un nombre por línea (mínimo 3):")
-    default_names = st.session_state.get("_uploaded_names", "Ana\nBerto\nCarla\nDavid")
     names_raw = st.text_area(
         label="Nombres",
         value=st.session_state.selected_group_names,
@@ -676,10 +2327,16 @@ def render_setup() -> None:
         key="players_input_area" 
     )
 
+    previous_count = len(_setup_player_names())
     if names_raw != st.session_state.selected_group_names:
         st.session_state.selected_group_names = names_raw
 
-    player_names = [n.strip() for n in names_raw.strip().splitlines() if n.strip()]
+    player_names = _setup_player_names()
+
+    # Sólo el nº de jugadores afecta a las opciones (máximo de impostores y
+    # validación): renombrar a alguien no relanza el resto de la página.
+    if len(player_names) != previous_count:
+        st.rerun()
 
     count_color = "#e63329" if len(player_names) < 3 else "#00d264"
     st.markdown(
@@ -687,35 +2344,61 @@ def render_setup() -> None:
         unsafe_allow_html=True,
     )
 
-    # ── OPCIONES ──
+
+@traced_fragment
+def setup_options_section() -> None:
+    for k, v in SETUP_OPTION_DEFAULTS.items():
+        if k not in st.session_state:
+            st.session_state[k] = v
+    player_names = _setup_player_names()
 
     st.markdown('<div class="section-header">&#9881; OPCIONES</div>', unsafe_allow_html=True)
 
     col_a, col_b = st.columns([1, 1])
     with col_a:
         max_imp = max(1, len(player_names) - 1)
+        st.session_state.opt_impostors = min(st.session_state.opt_impostors, max_imp)
         impostor_count = st.number_input(
             "Número de impostores",
-            min_value=1, max_value=max_imp, value=1,
+            min_value=1, max_value=max_imp, key="opt_impostors",
             help=f"Máximo {max_imp} con {len(player_names)} jugadores",
         )
     with col_b:
         st.markdown("<div style='height:28px'></div>", unsafe_allow_html=True)
         hints_enabled = st.toggle(
-            "&#128269; Pistas para impostores", value=True,
+            "&#128269; Pistas para impostores", key="opt_hints",
             help="Los impostores reciben una pista de la palabra secreta.",
         )
         chaos_mode = st.toggle(
-            "&#127922; Modo Caos (20%)", value=False,
+            "&#127922; Modo Caos (20%)", key="opt_chaos",
             help="Probabilidad de que TODOS sean impostores o TODOS inocentes.",
         )
 
     # ── BANCO DE PALABRAS ──
     st.markdown('<div class="section-header">&#128218; BANCO DE PALABRAS</div>', unsafe_allow_html=True)
     custom_mode = st.toggle(
-        "&#128296; Modo Personalizado",
+        "&#128296; Modo Personalizado", key="opt_custom",
         help="Usa tus propias palabras y pistas.",
     )
+    # El corpus integrado viene con niveles; un banco propio sin "~N" no los tiene
+    levelled = not custom_mode or get_room_bank(get_room_id(), refresh=False).has_levels
+    difficulty = st.select_slider(
+        "Dificultad", options=list(DIFFICULTY_WEIGHTS), key="opt_difficulty",
+        disabled=not levelled,
+        help="Fácil: palabras comunes y pistas obvias. Difícil: palabras raras y pistas sutiles.",
+    )
+    if not levelled:
+        st.caption("Tus palabras no tienen niveles: añade \"~1\" (obvia) o \"~3\" (sutil) a palabras y pistas para usar la dificultad.")
+    categories = []
+    if not custom_mode and corpus_categories():
+        categories = st.multiselect(
+            "Categorías",
+            corpus_categories(),
+            format_func=category_label,
+            placeholder="Todas las categorías",
+            help="Deja vacío para jugar con todo el corpus.",
+            key="opt_categories",
+        )
 
     # Validación
     errors = []
@@ -735,6 +2418,8 @@ def render_setup() -> None:
             hints_enabled  = hints_enabled,
             custom_mode    = custom_mode,
             chaos_mode     = chaos_mode,
+            categories     = list(categories),
+            difficulty     = difficulty,
         )
         if custom_mode:
             change_state(STATE_CUSTOM_WORDS)
@@ -742,6 +2427,32 @@ def render_setup() -> None:
             start_role_distribution()
         st.rerun()
 
+
+def render_setup() -> None:
+    st.markdown(GLOBAL_PAGE_CSS, unsafe_allow_html=True)
+
+    st.markdown("""
+    <div class="hero-wrap">
+        <div class="hero-el">EL</div>
+        <span class="hero-impostor">IMPOSTOR</span>
+        <div class="hero-sub">El juego de engaño y deducción social</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("---")
+    setup_room_section()
+
+    # ── GESTIÓN DE GRUPOS DE JUGADORES ──
+    if "selected_group_names" not in st.session_state:
+        st.session_state.selected_group_names = "Ana\nBerto\nCarla\nDavid"
+    setup_groups_section()
+
+    # ── JUGADORES ──
+    setup_players_section()
+
+    # ── OPCIONES ──
+    setup_options_section()
+
     with st.expander("&#8505; Cómo jugar"):
         st.markdown("""
 1. **Configura** jugadores, impostores y opciones.
@@ -754,11 +2465,13 @@ def render_setup() -> None:
 def render_custom_words() -> None:
     st.markdown(GLOBAL_PAGE_CSS, unsafe_allow_html=True)
     st.markdown('<div style="font-family:\'Bebas Neue\',sans-serif;font-size:2.5rem;color:#fff;letter-spacing:.05em;">&#128221; Palabras Personalizadas</div>', unsafe_allow_html=True)
-    st.caption("Añade palabras con al menos 3 pistas cada una.")
+    st.caption("Añade palabras con al menos 3 pistas cada una. Opcional: nivel con ~1 (obvia/común) a ~3 (sutil/rara) tras la palabra o la pista.")
+    render_storage_notice()
 
     with st.form("custom_form", clear_on_submit=True):
         word_input  = st.text_input("Palabra secreta", placeholder="Ej: Viaje a...")
-        hints_input = st.text_input("Pistas (separadas por coma)", placeholder="Ej: Coche de..., Vuelo, Maleta")
+        hints_input = st.text_input("Pistas (separadas por coma)", placeholder="Ej: Coche de..., Vuelo~1, Maleta~3")
+        allow_similar = st.checkbox("Guardar aunque se parezca a otra palabra del banco")
         if st.form_submit_button("&#10133; Añadir palabra", use_container_width=True):
             ph = [h.strip() for h in hints_input.split(",") if h.strip()]
             if not word_input.strip():
@@ -766,11 +2479,43 @@ def render_custom_words() -> None:
             elif len(ph) < 3:
                 st.error("Necesitas al menos 3 pistas.")
             else:
-                if add_word_to_db(word_input.strip(), ph):
-                    st.success(f"'{word_input.strip()}' guardada exitosamente.")
-                    st.session_state.custom_dataset = load_words_from_db()
+                try:
+                    entry = WordEntry(word_input.strip(), ph)
+                except ValueError as e:
+                    st.error(str(e))
                 else:
-                    st.error("Error al guardar. Puede que la palabra ya exista.")
+                    similar = [] if allow_similar else find_similar_words(entry.word)
+                    if similar:
+                        st.warning(f"'{entry.word}' se parece a: {', '.join(similar)}. Marca la casilla para guardarla igualmente.")
+                    elif add_word_to_db(entry.word, entry.stored_hints()):
+                        st.success(f"'{entry.word}' guardada exitosamente.")
+                        st.session_state.custom_dataset = get_room_bank(get_room_id(), refresh=False).words
+                    else:
+                        st.error("Error al guardar. Puede que la palabra ya exista.")
+
+    with st.expander("&#128229; Importar varias palabras", expanded=False):
+        st.caption("Una por línea — Palabra: pista, pista, pista")
+        bulk_raw = st.text_area("Importar", height=120, label_visibility="collapsed", placeholder="Faro~1: Luz~1, Costa, Barcos~3")
+        if st.button("Importar", use_container_width=True):
+            entries, invalid = [], []
+            for line in bulk_raw.splitlines():
+                if not line.strip():
+                    continue
+                word, _, hints_raw = line.partition(":")
+                try:
+                    if not word.strip():
+                        raise ValueError(line)
+                    entries.append(WordEntry(word.strip(), [h.strip() for h in hints_raw.split(",") if h.strip()]))
+                except ValueError:
+                    invalid.append(word.strip() or line.strip())
+            added, skipped = import_words_to_db(entries)
+            st.session_state.custom_dataset = get_room_bank(get_room_id(), refresh=False).words
+            if added:
+                st.success(f"{len(added)} palabras importadas.")
+            if skipped:
+                st.warning("Omitidas por parecerse a otras del banco: " + ", ".join(skipped))
+            if invalid:
+                st.error("Líneas no válidas (mínimo 3 pistas, sin pistas que delaten la palabra): " + ", ".join(invalid))
 
     dataset: List[WordEntry] = st.session_state.custom_dataset
     st.markdown(f'<div class="info-pill">&#128230; {len(dataset)} palabras en el banco</div>', unsafe_allow_html=True)
@@ -783,7 +2528,23 @@ def render_custom_words() -> None:
                 st.write(" · ".join(entry.hints))
                 if st.button("&#128465; Eliminar", key=f"del_{i}"):
                     delete_word_from_db(entry.word)
-                    st.session_state.custom_dataset = load_words_from_db() # Recargar
+                    st.session_state.custom_dataset = get_room_bank(get_room_id(), refresh=False).words # Recargar
+                    st.rerun()
+
+    # Palabras guardadas con reglas anteriores que ya no son válidas: no se
+    # juegan, pero se muestran para poder borrarlas y volver a añadirlas.
+    rejected = get_room_bank(get_room_id(), refresh=False).rejected
+    if rejected:
+        st.warning(f"{len(rejected)} palabras guardadas no se usan porque ya no pasan la validación. Bórralas y vuelve a añadirlas corregidas.")
+        for i, (word, hints, reason) in enumerate(rejected):
+            c_word, c_btn = st.columns([4, 1])
+            with c_word:
+                st.markdown(f"**{word}** — {' · '.join(hints)}")
+                st.caption(reason)
+            with c_btn:
+                if st.button("&#128465;", key=f"del_rejected_{i}", help=f"Eliminar '{word}'"):
+                    delete_word_from_db(word)
+                    st.session_state.custom_dataset = get_room_bank(get_room_id(), refresh=False).words
                     st.rerun()
 
     st.markdown("---")
@@ -827,6 +2588,7 @@ def render_role_distribution() -> None:
         label = "Siguiente jugador &#8594;" if idx < total - 1 else "&#10003; Comenzar partida"
         if st.button(label, type="primary", use_container_width=True):
             state.current_player_index += 1
+            save_game_snapshot()
             st.rerun()
     with col2:
         if st.button("&#8634;", use_container_width=True, help="Reiniciar"):
@@ -876,8 +2638,11 @@ def render_voting() -> None:
         st.selectbox("Sospechoso principal:", ["— Sin seleccionar —"] + player_names)
         st.markdown("<div style='height:.4rem'></div>", unsafe_allow_html=True)
         if st.button("&#128269; Revelar resultado", type="primary", use_container_width=True):
-            state.reveal_done = True; st.rerun()
+            state.reveal_done = True
+            save_game_snapshot(); st.rerun()
     else:
+        # La siguiente ronda se reparte en segundo plano mientras se lee el resultado
+        schedule_next_round()
         word = state.selected_word_entry.word
         st.markdown(f"""
         <div class="game-card" style="text-align:center;padding:1.8rem;">
@@ -910,10 +2675,10 @@ def render_voting() -> None:
         col1, col2 = st.columns(2)
         with col1:
             if st.button("&#8635; Nueva ronda", type="primary", use_container_width=True):
-                st.session_state.game_state = GameState()
-                start_role_distribution(); st.rerun()
+                start_role_distribution(take_next_round()); st.rerun()
         with col2:
             if st.button("&#127968; Inicio", use_container_width=True):
+                st.session_state.pop("next_round", None)
                 st.session_state.game_state  = GameState()
                 st.session_state.game_config = GameConfig()
                 change_state(STATE_SETUP); st.rerun()
@@ -940,15 +2705,19 @@ def main() -> None:
         initial_sidebar_state="collapsed",
     )
     init_session_state()
-    renderer = ROUTE_MAP.get(st.session_state.current_state)
+    trace_rerun()
+    phase = st.session_state.current_state
+    renderer = ROUTE_MAP.get(phase)
     if renderer:
-        renderer()
+        run_renderer(phase, renderer)
     else:
         st.error(f"Estado desconocido: '{st.session_state.current_state}'")
         if st.button("Reiniciar"):
             for k in list(st.session_state.keys()):
                 del st.session_state[k]
             st.rerun()
+    if tracing_enabled():
+        render_trace_panel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+"""
+Tablas de alias
+===============
+AliasTable.sample_distinct reparte según los pesos de dificultad y sin
+repetir índices.
+
+    python -m pytest -q tests
+"""
+
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest  # noqa: E402
+
+import app  # noqa: E402
+
+
+def test_sample_distinct_follows_weights():
+    random.seed(1234)
+    weights = [1.0, 2.0, 3.0, 4.0]
+    table = app.AliasTable(weights)
+    draws = 40_000
+
+    counts = Counter(table.sample_distinct(1)[0] for _ in range(draws))
+
+    for i, w in enumerate(weights):
+        assert counts[i] / draws == pytest.approx(w / sum(weights), abs=0.01)
+
+
+def test_sample_distinct_without_replacement():
+    random.seed(99)
+    table = app.AliasTable([1.0, 2.0, 3.0, 4.0, 0.0])
+    first = Counter()
+
+    for _ in range(10_000):
+        picked = table.sample_distinct(3)
+        assert len(picked) == len(set(picked)) == 3
+        assert 4 not in picked  # peso 0: nunca sale mientras haya alternativas
+        first[picked[0]] += 1
+
+    # El primer elegido sigue los pesos: 4 sale el más veces, 1 el que menos
+    assert first[3] > first[2] > first[1] > first[0]
+    assert sorted(table.sample_distinct(10)) == [0, 1, 2, 3, 4]
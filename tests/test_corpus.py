@@ -0,0 +1,59 @@
+"""
+Corpus integrado
+================
+Los niveles de cada palabra se guardan al compilar la categoría, así que las
+tablas de alias se construyen sin decodificar el pool.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("IMPOSTOR_STORAGE", "memory")
+os.environ.setdefault("IMPOSTOR_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="impostor_test_"))
+
+import app  # noqa: E402
+
+
+def test_compiled_levels_match_records():
+    for category in app.corpus_categories():
+        packed = app.open_corpus_category(category)
+        assert len(packed.levels) == packed.n_primary
+        assert list(packed.levels) == [app.corpus_entry(category, i).level for i in range(packed.n_primary)]
+
+
+def test_room_snapshot_levels(tmp_path):
+    path = tmp_path / "room.bin"
+    app.write_packed_records(path, [["Faro", "~1", "Luz~1", "Costa", "Barcos~3"], ["Isla", "Mar", "Arena", "Palmera"]],
+                             [["Grupo", "Ana", "Bea"]])
+    packed = app.PackedRecords(path)
+    try:
+        assert list(packed.levels) == [1, app.DEFAULT_LEVEL]
+        assert packed.record(2) == ["Grupo", "Ana", "Bea"]
+    finally:
+        packed.close()
+
+
+def level_share(entries, level: int) -> float:
+    return sum(e.level == level for e in entries) / len(entries)
+
+
+def test_tournament_words_follow_difficulty():
+    np = app._np()
+    levels = np.concatenate([np.frombuffer(app.open_corpus_category(c).levels, dtype=np.uint8)
+                             for c in app.corpus_categories()])
+    weights = np.array([0.0] + [app.DIFFICULTY_WEIGHTS["fácil"][lv] for lv in (1, 2, 3)])[levels]
+    expected = weights[levels == 3].sum() / weights.sum()
+
+    config = app.GameConfig(player_names=["Ana", "Bea", "Carlos", "Dani"], difficulty="fácil")
+    deal = app.deal_tournament([config] * 4000, rng=np.random.default_rng(7))
+    rounds = [app.deal_round(config).selected_word_entry for _ in range(4000)]
+
+    assert abs(level_share([deal.entry(t) for t in range(len(deal))], 3) - expected) < 0.03
+    assert abs(level_share(rounds, 3) - expected) < 0.03
@@ -0,0 +1,46 @@
+"""
+Casi-duplicados
+===============
+TrigramIndex y el backend en memoria: los duplicados se detectan por la forma
+normalizada y las palabras sin forma normalizada (emoji, otras escrituras) no
+coinciden entre sí.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("IMPOSTOR_STORAGE", "memory")
+
+import app  # noqa: E402
+
+
+def test_normalized_duplicates():
+    index = app.TrigramIndex(["Las Playas", "Montaña"])
+
+    assert index.similar("playa") == ["Las Playas"]
+    assert index.similar("Montana") == ["Montaña"]
+    assert index.similar("Desierto") == []
+
+
+def test_terms_without_normal_form_never_match():
+    assert app.normalize_term("🍔") == ""
+    index = app.TrigramIndex(["🍔", "Пицца"])
+
+    assert index.similar("🍕") == []
+    assert index.similar("Суши") == []
+
+
+def test_bulk_import_keeps_emoji_words():
+    storage = app.SQLiteBackend(":memory:")
+    storage.ensure_schema()
+    for word in ("🍔", "🍕"):
+        assert storage.similar_words("sala", word) == []
+        storage.add_word("sala", word, ["Pista uno", "Pista dos", "Pista tres"])
+
+    assert [w for w, _ in storage.load_word_rows("sala")] == ["🍕", "🍔"]
@@ -0,0 +1,132 @@
+"""
+Snapshots de partida
+====================
+Ida y vuelta de encode_game_snapshot / decode_game_snapshot, incluidos el modo
+caos con todos impostores, las partidas sin pistas y los snapshots que deben
+descartarse (otro formato, banco de palabras cambiado o caducados).
+
+    python -m pytest -q tests
+"""
+
+import os
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("IMPOSTOR_STORAGE", "memory")
+os.environ.setdefault("IMPOSTOR_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="impostor_test_"))
+
+import pytest  # noqa: E402
+
+import app  # noqa: E402
+
+NAMES = ["Ana", "Bea", "Carlos", "Dani", "Eva"]
+
+
+def round_trip(phase: str, config: app.GameConfig, state: app.GameState):
+    return app.decode_game_snapshot(app.encode_game_snapshot(phase, config, state), "public")
+
+
+def make_round(**options) -> tuple:
+    config = app.GameConfig(player_names=list(NAMES), **options)
+    return config, app.deal_round(config)
+
+
+@pytest.mark.parametrize("phase", [app.STATE_ROLE_DIST, app.STATE_GAME_ACTIVE, app.STATE_VOTING])
+@pytest.mark.parametrize("difficulty", list(app.DIFFICULTY_WEIGHTS))
+def test_round_trip_corpus_word(phase, difficulty):
+    config, state = make_round(impostor_count=2, categories=["comida"], difficulty=difficulty)
+    state.current_player_index = 3
+    state.round_start_time = 1_700_000_000.5
+    state.reveal_done = True
+
+    decoded = round_trip(phase, config, state)
+
+    assert decoded == (phase, config, state)
+    assert state.word_ref[0] == app.WORD_SOURCE_CORPUS
+
+
+def test_round_trip_default_word():
+    config = app.GameConfig(player_names=list(NAMES))
+    entry = app.default_dataset()[0]
+    state = app.GameState(players=app.build_players(config, entry), selected_word_entry=entry,
+                          starting_player_name="Carlos", word_ref=(app.WORD_SOURCE_DEFAULT, 0, "", ""))
+
+    assert round_trip(app.STATE_GAME_ACTIVE, config, state) == (app.STATE_GAME_ACTIVE, config, state)
+
+
+def test_chaos_all_impostors(monkeypatch):
+    # random() < 0.20 dispara el caos y choice([True, False]) elige "todos impostores"
+    monkeypatch.setattr(app.random, "random", lambda: 0.0)
+    monkeypatch.setattr(app.random, "choice", lambda seq: seq[0])
+    config, state = make_round(chaos_mode=True, categories=["animales"])
+    assert all(p.is_impostor and p.hint for p in state.players)
+
+    phase, decoded_config, decoded_state = round_trip(app.STATE_ROLE_DIST, config, state)
+
+    assert decoded_config.chaos_mode
+    assert decoded_state.players == state.players
+
+
+def test_hints_disabled():
+    config, state = make_round(impostor_count=2, hints_enabled=False)
+    assert all(p.hint is None for p in state.players if p.is_impostor)
+
+    _, decoded_config, decoded_state = round_trip(app.STATE_GAME_ACTIVE, config, state)
+
+    assert not decoded_config.hints_enabled
+    assert decoded_state.players == state.players
+
+
+def test_format_mismatch_is_ignored():
+    config, state = make_round()
+    buf = bytearray(app.encode_game_snapshot(app.STATE_GAME_ACTIVE, config, state))
+    struct.pack_into("<B", buf, 4, app.GAME_SNAPSHOT_FORMAT + 1)
+
+    assert app.decode_game_snapshot(bytes(buf), "public") is None
+
+
+def test_word_bank_version_mismatch_is_ignored():
+    config, state = make_round(categories=["lugares"])
+    source, index, version, category = state.word_ref
+    state.word_ref = (source, index, "f" * 32, category)
+
+    assert round_trip(app.STATE_GAME_ACTIVE, config, state) is None
+
+
+def test_expired_snapshot_is_ignored(monkeypatch):
+    config, state = make_round()
+    buf = app.encode_game_snapshot(app.STATE_GAME_ACTIVE, config, state)
+    now = app.time.time()
+    monkeypatch.setattr(app.time, "time", lambda: now + app.GAME_SNAPSHOT_MAX_AGE + 1)
+
+    assert app.decode_game_snapshot(buf, "public") is None
+    assert app.decode_game_snapshot(buf, "public", max_age=None) is not None
+
+
+def test_round_trip_many_players():
+    config = app.GameConfig(player_names=[f"Jugador {i}" for i in range(300)], impostor_count=40)
+    state = app.deal_round(config)
+    state.current_player_index = 299
+
+    assert round_trip(app.STATE_GAME_ACTIVE, config, state) == (app.STATE_GAME_ACTIVE, config, state)
+
+
+def test_custom_tournament_table_round_trip():
+    words = [app.WordEntry(word=w, hints=["Pista uno", "Pista dos", "Pista tres"]) for w in ("Faro", "Isla", "Puerto")]
+    bank = app.RoomBank(words=words, version="ab" * 16)
+    app.room_bank_cache().entries["torneo"] = bank
+    config = app.GameConfig(player_names=list(NAMES), custom_mode=True)
+
+    deal = app.deal_tournament([config] * 20, bank=bank)
+
+    for state in deal:
+        source, index, version, _ = state.word_ref
+        assert (source, version) == (app.WORD_SOURCE_CUSTOM, bank.version)
+        assert state.selected_word_entry is words[index]
+        buf = app.encode_game_snapshot(app.STATE_ROLE_DIST, config, state)
+        assert app.decode_game_snapshot(buf, "torneo") == (app.STATE_ROLE_DIST, config, state)
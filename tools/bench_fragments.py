@@ -0,0 +1,129 @@
+"""
+Reruns de página completa frente a reruns de fragmento
+======================================================
+Mide con streamlit.testing (AppTest) lo que cuesta el setup cuando se toca un
+widget: un rerun de página completa frente a un rerun acotado al fragmento
+que contiene el widget, que es lo que hace el navegador desde que el setup
+está dividido en `st.fragment`.
+
+AppTest sólo sabe relanzar el script entero, así que para los fragmentos se
+le inyecta la misma `fragment_id_queue` que enviaría el frontend. Por cada
+caso se informa del tiempo de script (mediana) y de cuántos elementos se
+vuelven a enviar.
+
+    python tools/bench_fragments.py
+    python tools/bench_fragments.py --runs 50
+"""
+
+import argparse
+import dataclasses
+import inspect
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("IMPOSTOR_STORAGE", "memory")
+
+from streamlit.testing.v1 import AppTest, app_test  # noqa: E402
+from streamlit.runtime.scriptrunner import ScriptRunnerEvent  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequests  # noqa: E402
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner  # noqa: E402
+
+SETUP_FRAGMENTS = ("setup_room_section", "setup_groups_section", "setup_players_section", "setup_options_section")
+
+
+class FragmentRunner(LocalScriptRunner):
+    """LocalScriptRunner que puede acotar el rerun a un fragmento y lo cronometra."""
+
+    fragment_id = None
+    last_ms = 0.0
+    last_elements = 0
+    script_cache = ScriptCache()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # AppTest crea una ScriptCache por run y recompilaría app.py cada vez;
+        # el servidor la conserva entre reruns
+        self._script_cache = FragmentRunner.script_cache
+        # El RerunData() inicial de página completa absorbería la cola de
+        # fragmentos al combinarse con la petición de run()
+        self._requests = ScriptRequests()
+        self._started = 0.0
+        self.on_event.connect(self._clock, weak=False)
+
+    def _clock(self, sender, event, **kwargs):
+        if event == ScriptRunnerEvent.SCRIPT_STARTED:
+            self._started = time.perf_counter()
+        elif event in (ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS, ScriptRunnerEvent.FRAGMENT_STOPPED_WITH_SUCCESS):
+            FragmentRunner.last_ms = (time.perf_counter() - self._started) * 1000
+
+    def request_rerun(self, rerun_data):
+        if FragmentRunner.fragment_id is not None:
+            rerun_data = dataclasses.replace(rerun_data, fragment_id_queue=[FragmentRunner.fragment_id])
+        return super().request_rerun(rerun_data)
+
+    def run(self, *args, **kwargs):
+        tree = super().run(*args, **kwargs)
+        FragmentRunner.last_elements = sum(
+            1 for msg in self.forward_msgs()
+            if msg.WhichOneof("type") == "delta" and msg.delta.WhichOneof("type") in ("new_element", "add_block")
+        )
+        return tree
+
+
+def fragment_ids(at: AppTest) -> dict:
+    """{nombre de la función: id del fragmento} a partir del registro de AppTest."""
+    ids = {}
+    for fid, fragment in at._fragment_storage._fragments.items():
+        func = inspect.getclosurevars(fragment).nonlocals.get("non_optional_func")
+        if func is not None:
+            ids[func.__name__] = fid
+    return ids
+
+
+def measure(at: AppTest, runs: int, fragment_id=None) -> tuple:
+    FragmentRunner.fragment_id = fragment_id
+    samples, elements = [], 0
+    for _ in range(runs):
+        at.run()
+        if at.exception:
+            sys.exit(f"La app lanzó una excepción: {at.exception[0].message}")
+        samples.append(FragmentRunner.last_ms)
+        elements = FragmentRunner.last_elements
+    FragmentRunner.fragment_id = None
+    return statistics.median(samples), elements
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    app_test.LocalScriptRunner = FragmentRunner
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=args.timeout)
+    at.run()
+    at.text_area(key="players_input_area").input("\n".join(f"Jugador {i + 1}" for i in range(args.players))).run()
+    ids = fragment_ids(at)
+    missing = [name for name in SETUP_FRAGMENTS if name not in ids]
+    if missing:
+        sys.exit(f"Fragmentos no registrados: {', '.join(missing)}")
+
+    full_ms, full_elements = measure(at, args.runs)
+    print(f"Setup con {args.players} jugadores, mediana de {args.runs} reruns\n")
+    print(f"{'rerun':>24} | {'script ms':>9} | {'elementos':>9}")
+    print(f"{'página completa':>24} | {full_ms:9.2f} | {full_elements:>9}")
+    for name in SETUP_FRAGMENTS:
+        ms, elements = measure(at, args.runs, ids[name])
+        print(f"{name:>24} | {ms:9.2f} | {elements:>9}  ({full_ms / ms:.1f}× más rápido)")
+
+
+if __name__ == "__main__":
+    main()
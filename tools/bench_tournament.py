@@ -0,0 +1,77 @@
+"""
+Benchmark del modo torneo
+=========================
+Compara repartir N mesas una a una (sample_corpus_entry + build_players, el
+camino de start_role_distribution) con `deal_tournament`, que reparte todas
+en una pasada con NumPy. En ambos casos se materializan todos los `Player`.
+
+    python tools/bench_tournament.py
+    python tools/bench_tournament.py --tables 1000 --players 6 --impostors 2 --runs 7
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+
+
+def per_table(configs):
+    states = []
+    for config in configs:
+        picked = app.sample_corpus_entry(config.categories)
+        entry = picked[2]
+        players = app.build_players(config, entry)
+        states.append(app.GameState(players=players, selected_word_entry=entry,
+                                    starting_player_name=random.choice(players).name))
+    return states
+
+
+def batched(configs):
+    return list(app.deal_tournament(configs, rng=np.random.default_rng()))
+
+
+def timed(fn, configs, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(configs)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", default="10,100,1000,10000")
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--impostors", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    names = [f"Jugador {i + 1}" for i in range(args.players)]
+    # Compila el corpus y valida todas sus entradas antes de medir, como en un
+    # proceso ya en marcha: ambos caminos comparten la caché de corpus_entry
+    for category in app.corpus_categories():
+        for index in range(app.open_corpus_category(category).n_primary):
+            app.corpus_entry(category, index)
+
+    print(f"{'mesas':>8} | {'una a una':>10} | {'torneo':>10} | {'x':>6}  (ms, mediana de {args.runs})")
+    for n in map(int, args.tables.split(",")):
+        configs = [
+            app.GameConfig(player_names=names, impostor_count=args.impostors, chaos_mode=(i % 4 == 0))
+            for i in range(n)
+        ]
+        slow = timed(per_table, configs, args.runs)
+        fast = timed(batched, configs, args.runs)
+        print(f"{n:>8} | {slow:>10.2f} | {fast:>10.2f} | {slow / fast:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Replay de trazas de la FSM
+==========================
+Vuelve a ejecutar sin navegador (streamlit.testing AppTest) una traza JSONL
+descargada desde el panel "Traza" de la app (IMPOSTOR_TRACE=1 o ?trace=1).
+Cada evento `rerun` restaura su fase y su snapshot de partida, ejecuta la app
+una vez y compara el tiempo del renderer con el registrado en producción.
+
+    python tools/replay_trace.py impostor_trace.jsonl
+    python tools/replay_trace.py impostor_trace.jsonl --profile replay.prof --top 20
+
+Las rondas con palabras personalizadas no se pueden reconstruir sin la sala
+(el snapshot sólo guarda una referencia) y se cuentan como omitidas. Los
+reruns de un solo fragmento del setup (eventos con `fragment`) no se
+relanzan: se resumen aparte con su tiempo en producción.
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import statistics
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("IMPOSTOR_STORAGE", "memory")
+os.environ["IMPOSTOR_TRACE"] = "1"
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import app  # noqa: E402
+
+SETUP_PHASES = (app.STATE_SETUP, app.STATE_CUSTOM_WORDS)
+
+
+def load_trace(path: Path) -> list:
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def recorded_render_ms(events: list) -> list:
+    """Empareja cada `rerun` con el `render` que le sigue (None si se cortó)."""
+    pairs, pending = [], None
+    for e in events:
+        if e.get("fragment"):
+            continue
+        if e["event"] == "rerun":
+            if pending is not None:
+                pairs.append((pending, None))
+            pending = e
+        elif e["event"] == "render" and pending is not None:
+            pairs.append((pending, e["ms"]))
+            pending = None
+    if pending is not None:
+        pairs.append((pending, None))
+    return pairs
+
+
+def restore(at: AppTest, rerun: dict) -> bool:
+    phase = rerun["phase"]
+    if phase in SETUP_PHASES or not rerun.get("snapshot"):
+        at.session_state["current_state"] = phase
+        return True
+    decoded = app.decode_game_snapshot(bytes.fromhex(rerun["snapshot"]), "", max_age=None)
+    if decoded is None:
+        return False
+    phase, config, state = decoded
+    at.session_state["current_state"] = phase
+    at.session_state["game_config"] = config
+    at.session_state["game_state"] = state
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", type=Path)
+    parser.add_argument("--profile", type=Path, help="guarda un perfil cProfile de los renderers")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    events = load_trace(args.trace)
+    transitions = [e for e in events if e["event"] == "transition"]
+    print(f"{len(events)} eventos · {len(transitions)} transiciones")
+    for prev, e in zip(transitions, transitions[1:]):
+        print(f"  {prev['target']:>18} → {e['target']:<18} tras {e['ts'] - prev['ts']:7.2f} s")
+
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=args.timeout)
+    profiler = cProfile.Profile() if args.profile else None
+    at.session_state["trace_profiler"] = profiler
+
+    by_phase, skipped = {}, 0
+    for rerun, prod_ms in recorded_render_ms(events):
+        if not restore(at, rerun):
+            skipped += 1
+            continue
+        at.run()
+        if at.exception:
+            print(f"✗ {rerun['phase']}: {at.exception[0].message}")
+            continue
+        renders = [e for e in at.session_state["trace"] if e["event"] == "render"]
+        replay_ms = renders[-1]["ms"] if renders else float("nan")
+        by_phase.setdefault(rerun["phase"], []).append((prod_ms, replay_ms))
+
+    print(f"\n{'fase':>18} | {'reruns':>6} | {'prod p50':>9} | {'replay p50':>10}  (ms)")
+    for phase, rows in by_phase.items():
+        prod = [p for p, _ in rows if p is not None]
+        prod_p50 = f"{statistics.median(prod):9.2f}" if prod else f"{'—':>9}"
+        print(f"{phase:>18} | {len(rows):>6} | {prod_p50} | {statistics.median(r for _, r in rows):10.2f}")
+    if skipped:
+        print(f"\n{skipped} reruns omitidos (palabra personalizada o snapshot incompatible)")
+
+    fragments = {}
+    for e in events:
+        if e["event"] == "render" and e.get("fragment"):
+            fragments.setdefault(e["fragment"], []).append(e["ms"])
+    if fragments:
+        print(f"\n{'fragmento':>24} | {'reruns':>6} | {'prod p50':>9}  (ms)")
+        for name, samples in fragments.items():
+            print(f"{name:>24} | {len(samples):>6} | {statistics.median(samples):9.2f}")
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        print(f"\nPerfil guardado en {args.profile}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Presupuesto de arranque de app.py
+=================================
+Mide con `python -X importtime` cuánto añade `import app` sobre el propio
+`import streamlit` (que es inevitable) y falla si:
+
+  * el coste propio de la app supera el presupuesto (ms),
+  * se importa en frío algún módulo que debe cargarse de forma diferida, o
+  * el primer render del setup (modo por defecto, con AppTest) importa
+    alguno de esos módulos en el hilo del script: la conexión a la BD se
+    resuelve en el hilo de refresco y no debe retrasar el primer pintado.
+
+Uso:
+    python tools/startup_budget.py            # presupuesto por defecto
+    python tools/startup_budget.py --budget-ms 40 --runs 7
+"""
+
+import argparse
+import json
+import os
+import py_compile
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_BUDGET_MS = 15.0
+
+# Módulos que sólo deben cargarse en su primer uso (modo personalizado, BD...)
+LAZY_MODULES = ("sqlalchemy", "sqlite3", "_sqlite3", "psycopg2", "numpy")
+
+
+def import_profile(statement: str) -> Dict[str, Tuple[int, int]]:
+    """Ejecuta `statement` en un intérprete limpio y devuelve {módulo: (self_us, cumulative_us)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Fallo al ejecutar '{statement}':\n{proc.stderr}")
+
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def app_overhead_ms() -> Tuple[float, Dict[str, int]]:
+    baseline = import_profile("import streamlit")
+    app = import_profile("import app")
+    extra = {name: self_us for name, (self_us, _) in app.items() if name not in baseline}
+    return sum(extra.values()) / 1000, extra
+
+
+class ScriptThreadImports:
+    """Finder de sys.meta_path que anota los módulos diferidos importados con ScriptRunContext."""
+
+    def __init__(self) -> None:
+        self.seen: List[str] = []
+
+    def find_spec(self, name, path=None, target=None):
+        from streamlit.runtime.scriptrunner_utils.script_run_context import get_script_run_ctx
+
+        top = name.split(".")[0]
+        if top in LAZY_MODULES and get_script_run_ctx(suppress_warning=True) is not None:
+            self.seen.append(top)
+        return None
+
+
+def render_probe() -> None:
+    """Primer render del setup con AppTest; imprime en JSON lo importado en el hilo del script."""
+    from streamlit.testing.v1 import AppTest
+
+    hook = ScriptThreadImports()
+    sys.meta_path.insert(0, hook)
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=30)
+    at.run()
+    if at.exception:
+        sys.exit(f"La app lanzó una excepción: {at.exception[0].message}")
+    print(json.dumps(sorted(set(hook.seen))))
+
+
+def first_render_imports() -> List[str]:
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--render-probe"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Fallo en el primer render:\n{proc.stdout}{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPOSTOR_STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--render-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.render_probe:
+        render_probe()
+        return
+
+    # Se mide con el bytecode ya generado, como en una réplica desplegada
+    py_compile.compile(str(ROOT / "app.py"), doraise=True)
+
+    samples, extra = [], {}
+    for _ in range(args.runs):
+        ms, extra = app_overhead_ms()
+        samples.append(ms)
+    median_ms = statistics.median(samples)
+
+    print(f"Coste propio de `import app` (mediana de {args.runs}): {median_ms:.1f} ms  (presupuesto {args.budget_ms:.1f} ms)")
+    for name, self_us in sorted(extra.items(), key=lambda kv: -kv[1])[:10]:
+        print(f"  {self_us / 1000:7.2f} ms  {name}")
+
+    failures = []
+    eager = sorted(m for m in extra if m.split(".")[0] in LAZY_MODULES)
+    if eager:
+        failures.append(f"Módulos que deberían ser diferidos: {', '.join(eager)}")
+    on_render = first_render_imports()
+    print(f"Módulos diferidos importados en el primer render del setup: {', '.join(on_render) or 'ninguno'}")
+    if on_render:
+        failures.append(f"El primer render espera a: {', '.join(on_render)}")
+    if median_ms > args.budget_ms:
+        failures.append(f"Presupuesto excedido: {median_ms:.1f} ms > {args.budget_ms:.1f} ms")
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()